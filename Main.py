@@ -1,15 +1,46 @@
+import startup_profile  # First, so the import time below is measured from here
+import perf_metrics
 import streamlit as st
+
+st.set_page_config(page_title="Đăng ký phép KXN", page_icon="🏖️")
+
+# The login form is painted before pandas, numpy and the modules built on
+# them are imported (about half a second on a cold start): they are only
+# needed once the form is submitted. See "Main app logic" at the end.
+if not st.session_state.get('is_logged_in', False):
+    st.title("Đăng ký phép/bù - Khoa Xét nghiệm")
+    username = st.text_input("Tài khoản", placeholder="e.g., 01234.bvhv")
+    password = st.text_input("Mật khẩu", type="password")
+    login_clicked = st.button("Login")
+    startup_profile.mark("login_form")
+    if not login_clicked:
+        st.stop()
+
 import pandas as pd
+import numpy as np
 from datetime import datetime
 import json
+import threading
+import time
 import pytz
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
-import time
 import locale
-
-st.set_page_config(page_title="Đăng ký phép KXN", page_icon="🏖️")
+from sheets_cache import DerivedCache, SheetCache
+from sheets_gateway import PRIORITY_BACKGROUND, PRIORITY_READ, PRIORITY_WRITE, SheetsGateway, is_rate_limited, is_retryable
+import sync_worker
+from sync_worker import SheetSyncWorker, is_background
+from leave_sync import IncrementalSheetSync, column_letter
+from leave_mirror import LeaveMirror
+from write_queue import StatusWriteQueue
+from leave_frame import LEAVE_COLUMNS, RECORD_ID_COLUMN, prepare_leave_frame, update_leave_frame
+from row_locator import RowLocator, new_record_id
+from staff_index import StaffIndex
+from registration_index import RegistrationIndex, registration_key
+from leave_stats import LeaveStats, half_of
+from leave_occupancy import DailyOccupancy
+import leave_archive
+
+startup_profile.mark("imports")  # After the login form on a logged-out first run
 
 
 # Google Sheets document IDs and ranges
@@ -20,107 +51,852 @@ NHANVIEN_SHEET_RANGE = 'Sheet1'
 LEAVE_SHEET_ID = '1WFaY0f6Mlkin5PE-l1KvN5sq0yteJfOSVwkzr_TYplo'
 LEAVE_SHEET_RANGE = 'Sheet1'
 
-# Load Google credentials from Streamlit Secrets
-google_credentials = st.secrets["GOOGLE_CREDENTIALS"]
-credentials_info = json.loads(google_credentials)
+# Seconds a sheet read is reused by all sessions before hitting the API again
+SHEET_CACHE_TTL = 60
+
+# Incremental sync of the leave sheet: read only appended rows on each refresh,
+# re-read the status columns (F-H) every LEAVE_STATUS_REFRESH seconds and the
+# whole sheet every LEAVE_FULL_REFRESH seconds
+LEAVE_INCREMENTAL_SYNC = True
+LEAVE_STATUS_REFRESH = 180
+LEAVE_FULL_REFRESH = 1800
+
+# Optional local SQLite mirror of the leave and staff sheets. Set a file path
+# (e.g. "leave_mirror.sqlite3") to answer page queries from indexed tables and
+# keep serving reads while the Sheets API is throttled; None disables it.
+LEAVE_MIRROR_PATH = None
+
+# Background sync: a worker thread checks the sheets for changes every
+# BACKGROUND_SYNC_INTERVAL seconds (slowing down to BACKGROUND_SYNC_MAX_INTERVAL
+# while nothing changes) and replaces the shared snapshots only when they did.
+# The staff sheet is re-read at most every STAFF_SYNC_INTERVAL seconds. While
+# the worker runs, sessions reuse snapshots for up to SYNCED_CACHE_TTL seconds.
+# None disables the worker and sessions reload every SHEET_CACHE_TTL seconds.
+BACKGROUND_SYNC_INTERVAL = 10
+BACKGROUND_SYNC_MAX_INTERVAL = 120
+STAFF_SYNC_INTERVAL = 300
+SYNCED_CACHE_TTL = 600
+
+# Leave history is partitioned by year: the leave tab keeps the last
+# LEAVE_HOT_YEARS years (plus any leave still pending), and closed years are
+# moved to one archive tab per year (NghiPhep_<year>) from the "Xuất dữ liệu"
+# page, or every LEAVE_ARCHIVE_INTERVAL seconds by the sync worker (None: only
+# by hand). Archive tabs are read only when a date range reaches them, and
+# are cached for ARCHIVE_CACHE_TTL seconds. Deleting the archived rows is
+# attempted up to ARCHIVE_DELETE_ATTEMPTS times, re-checking them each time.
+LEAVE_HOT_YEARS = 1
+LEAVE_ARCHIVE_INTERVAL = None
+ARCHIVE_CACHE_TTL = 3600
+ARCHIVE_DELETE_ATTEMPTS = 3
+
+# Sheets API requests per minute allowed for the whole process (all sessions)
+SHEETS_REQUESTS_PER_MINUTE = 60
+
+# State a leave must still be in for an approval or rejection to be written
+PENDING_STATE = {"DuyetPhep": "", "HuyPhep": ""}
+
+# Rows per page of "Danh sách đăng ký phép", and row colours by approval status
+ALL_LEAVES_PAGE_SIZE = 50
+STATUS_STYLES = {
+    'Duyệt': 'background-color: lightgreen',
+    'Không duyệt': 'background-color: lightcoral'  # Light red background
+}
+
+# Approvals are flagged when they would leave fewer staff than this at work
+# on the day (default of the "Số nhân viên tối thiểu mỗi ngày" field)
+MIN_STAFF_ON_DUTY = 5
+
+# Public holidays skipped by multi-day registration: fixed dates (MM-DD), and
+# dates that change every year such as Tết (YYYY-MM-DD, add them each year)
+PUBLIC_HOLIDAYS = {"01-01", "04-30", "05-01", "09-02"}
+EXTRA_HOLIDAYS = set()
+
+# Approvals, rejections and cancellations are queued and written together in
+# one batchUpdate this many seconds after the first click
+WRITE_FLUSH_DELAY = 2
+
+# Performance snapshots (see the "Hiệu năng" page) are also appended to this
+# JSON-lines file every PERF_LOG_INTERVAL seconds; None keeps them in memory only
+PERF_LOG_PATH = None
+PERF_LOG_INTERVAL = 300
+
+
+@st.cache_resource
+def get_sheets_service():
+    """Google Sheets API client, built once per process and shared by every session.
+
+    Built on the first API call, so the login form is shown before the Google
+    client libraries are even imported.
+    """
+    from sheets_client import build_sheets_service
+
+    # Load Google credentials from Streamlit Secrets
+    credentials_info = json.loads(st.secrets["GOOGLE_CREDENTIALS"])
+    return build_sheets_service(credentials_info)
+
+
+@st.cache_resource
+def get_sheets_gateway():
+    """Rate limiter and retry policy that every Sheets API call goes through."""
+    return SheetsGateway(requests_per_minute=SHEETS_REQUESTS_PER_MINUTE)
+
+
+@st.cache_resource
+def get_sheet_cache():
+    """One cache per server process, shared by every browser session."""
+    return SheetCache(ttl=SHEET_CACHE_TTL)
+
+
+@st.cache_resource
+def get_leave_sync():
+    """Process-wide incremental copy of the leave sheet."""
+    return IncrementalSheetSync(
+        lambda range_name: _fetch_values(LEAVE_SHEET_ID, range_name),
+        LEAVE_SHEET_RANGE,
+        status_interval=LEAVE_STATUS_REFRESH,
+        full_interval=LEAVE_FULL_REFRESH,
+        on_read=_ensure_record_ids
+    )
 
-# Authenticate using the service account credentials
-credentials = service_account.Credentials.from_service_account_info(
-    credentials_info,
-    scopes=["https://www.googleapis.com/auth/spreadsheets"]
-)
 
-# Initialize the Google Sheets API client
-sheets_service = build('sheets', 'v4', credentials=credentials)
+@st.cache_resource
+def get_leave_mirror():
+    """Process-wide SQLite mirror, or None when LEAVE_MIRROR_PATH is not set."""
+    if not LEAVE_MIRROR_PATH:
+        return None
+    return LeaveMirror(LEAVE_MIRROR_PATH)
 
 
-def fetch_sheet_data(sheet_id, range_name, max_retries=3, cache_time=60):
-    """Fetch Google Sheets data with caching and error handling."""
-    
-    # Use session state to cache the data
-    cache_key = f"sheet_data_{sheet_id}_{range_name}"
-    if cache_key in st.session_state and time.time() - st.session_state[cache_key]["timestamp"] < cache_time:
-        return st.session_state[cache_key]["data"]
+@st.cache_resource
+def get_row_locator():
+    """Process-wide map from leave record IDs (maPhep) to their sheet rows."""
+    return RowLocator(
+        _leave_batch_get,
+        LEAVE_SHEET_RANGE,
+        LEAVE_COLUMNS,
+        RECORD_ID_COLUMN
+    )
 
-    attempt = 0
-    while attempt < max_retries:
-        try:
-            result = sheets_service.spreadsheets().values().get(
-                spreadsheetId=sheet_id,
-                range=range_name
-            ).execute()
-            values = result.get('values', [])
 
-            if not values:
-                st.warning("⚠️ Không tìm thấy dữ liệu trong phạm vi được chỉ định.")
-                return pd.DataFrame()
+@st.cache_resource
+def get_write_queue():
+    """Process-wide write-behind queue for leave status cells."""
+    return StatusWriteQueue(
+        _write_leave_cells,
+        get_row_locator().resolve,
+        LEAVE_SHEET_RANGE,
+        LEAVE_COLUMNS,
+        RECORD_ID_COLUMN,
+        flush_delay=WRITE_FLUSH_DELAY,
+        max_retries=1,  # The gateway already retries with backoff
+        on_flushed=lambda: invalidate_sheet_data(LEAVE_SHEET_ID, LEAVE_SHEET_RANGE)
+    )
 
-            headers = values[0]
-            data = values[1:]
-            data = [row + [""] * (len(headers) - len(row)) for row in data]
 
-            df = pd.DataFrame(data, columns=headers)
+def _cached_sheet_data(sheet_id, range_name, max_retries=3, cache_time=SHEET_CACHE_TTL):
+    """The shared cached frame itself (do not modify), or None if unavailable."""
+    if get_sync_worker() is not None:
+        # The worker keeps the snapshot fresh; only reload here if it stalls
+        cache_time = max(cache_time, SYNCED_CACHE_TTL)
 
-            # Cache the result in session state
-            st.session_state[cache_key] = {"data": df, "timestamp": time.time()}
-            return df
+    # Use the process-wide cache so concurrent sessions share one API call
+    return get_sheet_cache().get(
+        _sheet_cache_key(sheet_id, range_name), _sheet_loader(sheet_id, range_name, max_retries), ttl=cache_time
+    )
+
+
+def _sheet_cache_key(sheet_id, range_name):
+    return f"sheet_data_{sheet_id}_{range_name}"
+
+
+def _sheet_loader(sheet_id, range_name, max_retries=3):
+    """Function that loads a fresh snapshot of a sheet (None if unavailable)."""
+    if LEAVE_INCREMENTAL_SYNC and (sheet_id, range_name) == (LEAVE_SHEET_ID, LEAVE_SHEET_RANGE):
+        load = get_leave_sync().refresh
+    else:
+        load = lambda: _load_sheet_data(sheet_id, range_name, max_retries)
+
+    @perf_metrics.timed("frame.load")
+    def loader():
+        df = load()
+        mirror = get_leave_mirror()
+
+        if (sheet_id, range_name) == (LEAVE_SHEET_ID, LEAVE_SHEET_RANGE):
+            fresh = df is not None
+            # Fall back to the mirror when the Sheets API cannot be reached
+            if df is None and mirror is not None and mirror.has_leaves():
+                perf_metrics.count("mirror.fallback")
+                df = mirror.leaves()
+            if df is None:
+                return None
+
+            if fresh:
+                if not LEAVE_INCREMENTAL_SYNC:
+                    df = _ensure_record_ids(df)  # The sync does this after each read
+                get_row_locator().update(df)
+
+            # Show queued status changes before they reach the sheet
+            df = get_write_queue().overlay(df)
+            if mirror is not None:
+                mirror.sync_leaves(df)
+        elif sheet_id == NHANVIEN_SHEET_ID and mirror is not None:
+            if df is not None:
+                mirror.sync_staff(df)
+            elif mirror.has_staff():
+                perf_metrics.count("mirror.fallback")
+                df = mirror.staff()
+        return df
+
+    return loader
+
+
+def _same_frame(old, new):
+    return old.equals(new) and list(old.columns) == list(new.columns)
+
+
+def _sync_job(sheet_id, range_name):
+    """Worker job: reload a sheet and publish it only if it changed."""
+    return lambda: get_sheet_cache().refresh(
+        _sheet_cache_key(sheet_id, range_name), _sheet_loader(sheet_id, range_name), same=_same_frame
+    )
 
-        except HttpError as e:
-            attempt += 1
-            if "RATE_LIMIT_EXCEEDED" in str(e):
-                wait_time = 10  # Wait longer to avoid rate limit
-                st.warning(f"🔄 Quota exceeded. Thử lại sau {wait_time} giây...")
-                time.sleep(wait_time)
-            else:
-                st.error(f"❌ Lỗi API: {e}")
-                return pd.DataFrame()
 
-    return pd.DataFrame()  # Return empty DataFrame if all retries fail
+@st.cache_resource
+def get_sync_worker():
+    """Process-wide background sync worker, or None when BACKGROUND_SYNC_INTERVAL is None."""
+    # After the resource cache is cleared the previous worker is still running
+    sync_worker.stop_all()
+    if not BACKGROUND_SYNC_INTERVAL:
+        return None
+    return SheetSyncWorker(
+        [
+            # Only the rows below the last known one, plus the status columns every LEAVE_STATUS_REFRESH
+            ("leave", _sync_job(LEAVE_SHEET_ID, LEAVE_SHEET_RANGE), 0),
+            ("staff", _sync_job(NHANVIEN_SHEET_ID, NHANVIEN_SHEET_RANGE), STAFF_SYNC_INTERVAL),
+        ] + (
+            [("archive", lambda: bool(archive_closed_years()), LEAVE_ARCHIVE_INTERVAL)] if LEAVE_ARCHIVE_INTERVAL else []
+        ),
+        interval=BACKGROUND_SYNC_INTERVAL,
+        max_interval=BACKGROUND_SYNC_MAX_INTERVAL
+    ).start()
+
+
+def invalidate_sheet_data(sheet_id, range_name, status_changed=True):
+    """Drop the cached copy of a sheet after writing to it.
+
+    Pass `status_changed=False` after a write that only appended rows: the
+    next refresh of the leave sheet reads the new tail anyway, and the status
+    columns are then re-read on their usual interval.
+    """
+    if status_changed and LEAVE_INCREMENTAL_SYNC and (sheet_id, range_name) == (LEAVE_SHEET_ID, LEAVE_SHEET_RANGE):
+        get_leave_sync().mark_status_dirty()
+    get_sheet_cache().invalidate(_sheet_cache_key(sheet_id, range_name))
+
+    # Data is changing: check for more changes soon
+    worker = get_sync_worker()
+    if worker is not None:
+        worker.poke()
+
+
+def _load_sheet_data(sheet_id, range_name, max_retries):
+    """Read a sheet into a DataFrame; returns None when the read fails."""
+    values = _fetch_values(sheet_id, range_name, max_retries)
+    if values is None:
+        return None
+
+    if not values:
+        st.warning("⚠️ Không tìm thấy dữ liệu trong phạm vi được chỉ định.")
+        return None
+
+    return _values_frame(values)
+
+
+def _values_frame(values):
+    """DataFrame of raw sheet `values` (header row first), short rows padded with ""."""
+    headers = values[0]
+    data = values[1:]
+    data = [row + [""] * (len(headers) - len(row)) for row in data]
+
+    return pd.DataFrame(data, columns=headers)
+
+
+def _execute(span_name, request, **kwargs):
+    """Run a Sheets API request through the gateway, timed as `span_name`."""
+    with perf_metrics.span(span_name):
+        return get_sheets_gateway().execute(request, **kwargs)
+
+
+def _write_leave_cells(data):
+    """Write the `data` ranges of a batchUpdate body to the leave sheet."""
+    _execute(
+        "sheets.write",
+        get_sheets_service().spreadsheets().values().batchUpdate(
+            spreadsheetId=LEAVE_SHEET_ID,
+            body={"valueInputOption": "RAW", "data": data}
+        ),
+        priority=PRIORITY_WRITE
+    )
+
 
+def _leave_batch_get(ranges):
+    """`values` of each of `ranges` of the leave sheet, read with one batchGet."""
+    return [
+        value_range.get('values', [])
+        for value_range in _execute(
+            "sheets.verify",
+            get_sheets_service().spreadsheets().values().batchGet(
+                spreadsheetId=LEAVE_SHEET_ID,
+                ranges=ranges
+            ),
+            priority=PRIORITY_WRITE
+        ).get('valueRanges', [])
+    ]
 
 
+def _row_runs(indexes):
+    """[first, last] of each run of consecutive frame indexes."""
+    runs = []
+    for index in sorted(indexes):
+        if runs and index == runs[-1][1] + 1:
+            runs[-1][1] = index
+        else:
+            runs.append([index, index])
+    return runs
+
+
+# Columns that identify a registration when checking a row before writing its ID
+REGISTRATION_COLUMNS = ['maNVYT', 'ngayDangKy', 'loaiPhep', 'thoiGianDangKy']
+
+
+def _ensure_record_ids(df):
+    """Give leave rows without a maPhep one, written back in a single batchUpdate.
+
+    Rows registered before the column existed (or typed into the sheet by
+    hand) get their ID here; the returned frame includes it. Called with
+    full reads of the leave tab and with the rows of tail reads (`df` is
+    indexed by sheet row - 2 in both). IDs are written by row position, so
+    the rows are read again first (under the write queue's flush lock) and
+    an ID is only written into a row that still holds the same registration
+    and an empty ID cell; an ID already there is taken over instead.
+    """
+    if RECORD_ID_COLUMN in df.columns:
+        missing = df.index[df[RECORD_ID_COLUMN] == ""]
+    else:
+        missing = df.index
+    if RECORD_ID_COLUMN in df.columns and missing.empty:
+        return df
+
+    id_position = LEAVE_COLUMNS.index(RECORD_ID_COLUMN)
+    letter = column_letter(id_position + 1)
+    runs = _row_runs(missing)
+    ids, new_ids = {}, []
+    try:
+        with get_write_queue().flush_lock():
+            header, *current = _leave_batch_get(
+                [f"{LEAVE_SHEET_RANGE}!{letter}1"] +
+                [f"{LEAVE_SHEET_RANGE}!A{first + 2}:{letter}{last + 2}" for first, last in runs]
+            )
+            header = header[0][0] if header and header[0] else ""
+            if header not in ("", RECORD_ID_COLUMN):
+                st.warning(f"⚠️ Cột {letter} của dữ liệu nghỉ phép không phải {RECORD_ID_COLUMN}; không tạo mã phép.")
+                return df
+
+            for (first, last), values in zip(runs, current):
+                for index, cells in zip(range(first, last + 1), values + [[]] * (last - first + 1 - len(values))):
+                    cells = cells + [""] * (len(LEAVE_COLUMNS) - len(cells))
+                    if any(cells[LEAVE_COLUMNS.index(col)] != df.at[index, col] for col in REGISTRATION_COLUMNS):
+                        continue  # The row changed since the read; next full read
+                    ids[index] = cells[id_position] or new_record_id()
+                    if not cells[id_position]:
+                        new_ids.append(index)
+
+            data = []
+            if not header:
+                data.append({"range": f"{LEAVE_SHEET_RANGE}!{letter}1", "values": [[RECORD_ID_COLUMN]]})
+            # One range per run of consecutive rows
+            for first, last in _row_runs(new_ids):
+                data.append({
+                    "range": f"{LEAVE_SHEET_RANGE}!{letter}{first + 2}:{letter}{last + 2}",
+                    "values": [[ids[i]] for i in range(first, last + 1)]
+                })
+            if data:
+                _write_leave_cells(data)
+    except HttpError as e:
+        st.warning(f"⚠️ Không thể tạo mã phép cho các dòng cũ: {e}")
+        return df
+
+    df = df.copy()
+    if RECORD_ID_COLUMN not in df.columns:
+        df[RECORD_ID_COLUMN] = ""
+    if ids:
+        df.loc[list(ids), RECORD_ID_COLUMN] = pd.Series(ids, dtype=object)
+    return df
+
+
+def _fetch_values(sheet_id, range_name, max_retries=3, priority=None):
+    """Raw `values` of a range (empty list if the range is empty, None on failure)."""
+    if priority is None:
+        priority = PRIORITY_BACKGROUND if is_background() else PRIORITY_READ
+    try:
+        result = _execute(
+            "sheets.read",
+            get_sheets_service().spreadsheets().values().get(
+                spreadsheetId=sheet_id,
+                range=range_name
+            ),
+            priority=priority,
+            max_retries=max_retries
+        )
+        return result.get('values', [])
+
+    except HttpError as e:
+        if is_background():
+            raise  # Counted by the sync worker; nobody to show it to
+        perf_metrics.count("sheets.failed_reads")
+        if is_rate_limited(e):
+            st.warning("🔄 Quota exceeded. Vui lòng thử lại sau ít phút.")
+        else:
+            st.error(f"❌ Lỗi API: {e}")
+        return None
+
 
 # Function to append data to a Google Sheet
 def append_to_sheet(sheet_id, range_name, values):
     body = {'values': values}
-    sheets_service.spreadsheets().values().append(
-        spreadsheetId=sheet_id,
-        range=range_name,
-        valueInputOption="USER_ENTERED",
-        insertDataOption="INSERT_ROWS",
-        body=body
-    ).execute()
-
-# Load Google Sheets data into Streamlit session state
-if 'nhanvien_df' not in st.session_state:
-    st.session_state['nhanvien_df'] = fetch_sheet_data(NHANVIEN_SHEET_ID, NHANVIEN_SHEET_RANGE)
+    _execute(
+        "sheets.append",
+        get_sheets_service().spreadsheets().values().append(
+            spreadsheetId=sheet_id,
+            range=range_name,
+            valueInputOption="USER_ENTERED",
+            insertDataOption="INSERT_ROWS",
+            body=body
+        ),
+        priority=PRIORITY_WRITE,
+        idempotent=False  # A retried append would add the rows twice
+    )
+    invalidate_sheet_data(sheet_id, range_name, status_changed=False)
 
-# Login helper function
-def check_login(username, password):
-    nhanvien_df = st.session_state['nhanvien_df']
-    user = nhanvien_df[(nhanvien_df['taiKhoan'].astype(str) == str(username)) & 
-                       (nhanvien_df['matKhau'].astype(str) == str(password))]
-    if not user.empty:
-        return user.iloc[0]
-    return None
 
-# Display all leaves with highlighting for approved ones
-def display_all_leaves():
-    leave_df = fetch_sheet_data(LEAVE_SHEET_ID, LEAVE_SHEET_RANGE)
+def queue_status_update(record_id, values, expected):
+    """Queue a status change ({column: value}) for the leave record `record_id`.
+
+    `expected` ({column: value}) is the state the change applies to; if the
+    record has changed in the sheet meanwhile, the change is not written. The
+    change is visible to every page right away and written to the sheet in
+    the next batch.
+    """
+    queue_status_updates({record_id: values}, expected)
+
+
+def queue_status_updates(updates, expected):
+    """Queue status changes for several records ({maPhep: {column: value}}).
+
+    `expected` is the state every record must still be in.
+    """
+    if "" in updates:
+        raise ValueError("Leave records without a maPhep cannot be updated")
+    get_write_queue().enqueue_many(updates, {record_id: expected for record_id in updates})
+    get_sheet_cache().invalidate(_sheet_cache_key(LEAVE_SHEET_ID, LEAVE_SHEET_RANGE))
+
+
+def display_pending_writes():
+    """On admin pages, show queued status changes and allow writing them now."""
+    write_queue = get_write_queue()
+    for record_id, values, reason in write_queue.take_conflicts():
+        st.warning(
+            f"⚠️ Không ghi thay đổi {values} cho phép {record_id}: "
+            f"đăng ký đã bị thay đổi hoặc không còn trong Google Sheets ({reason})."
+        )
+
+    pending = write_queue.pending_count()
+    if not pending:
+        return
+
+    st.info(f"⏳ {pending} thay đổi đang chờ ghi vào Google Sheets.")
+    if st.button("Ghi ngay", key="flush_writes"):
+        if write_queue.flush():
+            st.success("Đã ghi tất cả thay đổi.")
+        else:
+            st.error(f"❌ Lỗi khi ghi dữ liệu: {write_queue.last_error}")
+
+
+def flash_and_rerun(level, message):
+    """Rerun the page and show `message` (st.success/st.error/...) at the top of it."""
+    st.session_state['flash_message'] = (level, message)
+    count_session_calls()
+    st.rerun()
+
+
+# Sheets calls made by this session: spans named "sheets.*" on the script
+# thread since the run started (calls from the worker and the write queue
+# threads are not counted)
+_run_start_calls = perf_metrics.thread_count("sheets.")
+_run_calls_counted = False
+
+
+def count_session_calls():
+    """Add this run's Sheets calls to the session's totals (once per run)."""
+    global _run_calls_counted
+    if _run_calls_counted:
+        return
+    _run_calls_counted = True
+    st.session_state['sheets_calls'] = (
+        st.session_state.get('sheets_calls', 0) + perf_metrics.thread_count("sheets.") - _run_start_calls
+    )
+    st.session_state['script_runs'] = st.session_state.get('script_runs', 0) + 1
+
+
+def show_flash_message():
+    if 'flash_message' in st.session_state:
+        level, message = st.session_state.pop('flash_message')
+        getattr(st, level)(message)
+
+
+# Leave queries used by the pages. Each returns the matching rows as a typed
+# frame (see leave_frame.prepare_leave_frame) with the sheet-based index, from
+# the SQLite mirror when it is enabled or by masking the shared typed frame.
+@st.cache_resource
+def get_typed_frame_cache():
+    """Typed leave frame shared by all sessions, updated once per data version
+    (only the changed rows when the incremental sync knows them)."""
+    return DerivedCache(
+        perf_metrics.timed("frame.prepare_leave")(prepare_leave_frame),
+        update=perf_metrics.timed("frame.update_leave")(
+            lambda leave_df, old_raw_df, raw_df, rows: update_leave_frame(leave_df, raw_df, rows)
+        )
+    )
+
+
+def get_leave_frame(start_date=None, end_date=None):
+    """Typed frame of the leave tab (shared, do not modify in place).
 
-    # Ensure required columns exist
-    required_columns = ['maNVYT', 'tenNhanVien', 'ngayDangKy', 'loaiPhep', 'thoiGianDangKy', 'DuyetPhep', 'HuyPhep']
-    for col in required_columns:
-        if col not in leave_df.columns:
-            leave_df[col] = ""  # Add missing columns with default values
+    When [start_date, end_date] reaches archived years, their archive tabs
+    are included (see leave_archive.combine).
+    """
+    leave_df = _typed_leave_frame(_cached_sheet_data(LEAVE_SHEET_ID, LEAVE_SHEET_RANGE))
+    return leave_archive.combine(_archived_leave_frames(start_date, end_date) + [leave_df])
 
-    # Convert `ngayDangKy` and `thoiGianDangKy` to datetime for filtering and formatting
-    leave_df['ngayDangKy'] = pd.to_datetime(leave_df['ngayDangKy'], errors='coerce')
-    leave_df['thoiGianDangKy'] = pd.to_datetime(leave_df['thoiGianDangKy'], errors='coerce')
 
-    # Filter out rows where `HuyPhep` is not empty
-    leave_df = leave_df[leave_df['HuyPhep'].isnull() | (leave_df['HuyPhep'] == "")]
+@st.cache_resource
+def get_archive_frame_cache(year):
+    """Typed frame of one archive tab, rebuilt once per data version."""
+    return DerivedCache(perf_metrics.timed("frame.prepare_archive")(prepare_leave_frame))
 
+
+def _fetch_leave_tabs(priority=None):
+    """{tab title: sheetId} of the leave spreadsheet, read now (raises HttpError)."""
+    if priority is None:
+        priority = PRIORITY_BACKGROUND if is_background() else PRIORITY_READ
+    result = _execute(
+        "sheets.read",
+        get_sheets_service().spreadsheets().get(
+            spreadsheetId=LEAVE_SHEET_ID,
+            fields="sheets.properties(sheetId,title)"
+        ),
+        priority=priority
+    )
+    return {sheet['properties']['title']: sheet['properties']['sheetId'] for sheet in result.get('sheets', [])}
+
+
+def _leave_tabs_key():
+    return f"sheet_tabs_{LEAVE_SHEET_ID}"
+
+
+def _leave_tabs():
+    """{tab title: sheetId} of the leave spreadsheet ({} if it cannot be read)."""
+    try:
+        return get_sheet_cache().get(_leave_tabs_key(), _fetch_leave_tabs, ttl=ARCHIVE_CACHE_TTL)
+    except HttpError as e:
+        st.warning(f"⚠️ Không đọc được danh sách dữ liệu lưu trữ: {e}")
+        return {}
+
+
+def _archived_leave_frames(start_date, end_date):
+    """Typed frames of the archive tabs that [start_date, end_date] reaches.
+
+    The default ranges of the pages stay within the leave tab, so this
+    usually makes no API call at all.
+    """
+    first_hot_day = leave_archive.hot_start(LEAVE_HOT_YEARS)
+    if start_date is None or pd.Timestamp(start_date) >= first_hot_day:
+        return []
+
+    frames = []
+    years = leave_archive.archive_years(_leave_tabs())
+    for year in leave_archive.years_to_read(years, start_date, end_date, first_hot_day):
+        raw_df = _cached_sheet_data(LEAVE_SHEET_ID, leave_archive.archive_tab(year), cache_time=ARCHIVE_CACHE_TTL)
+        if raw_df is not None:
+            frames.append(get_archive_frame_cache(year).get(raw_df))
+    return frames
+
+
+def _with_archives(leaves, start_date, end_date, select):
+    """`leaves` from the leave tab plus `select(frame)` of each archive tab the range reaches."""
+    archived = [select(frame) for frame in _archived_leave_frames(start_date, end_date)]
+    return leave_archive.combine(archived + [leaves]) if archived else leaves
+
+
+@st.cache_resource
+def get_archive_lock():
+    """Only one archival run at a time (page button or background worker)."""
+    return threading.Lock()
+
+
+def archive_closed_years():
+    """Move the closed leaves of past years from the leave tab to their archive tabs.
+
+    Leaves dated before leave_archive.hot_start(LEAVE_HOT_YEARS) that are no
+    longer pending are appended to NghiPhep_<year> (created when missing),
+    then deleted from the leave tab. Leaves already in their archive tab,
+    left by a run that stopped before deleting, are only deleted. Returns
+    {year: leaves archived}; raises HttpError or RuntimeError on failure.
+    """
+    # Queued status changes of archived leaves could no longer be written
+    write_queue = get_write_queue()
+    if not write_queue.flush():
+        raise RuntimeError(f"Không ghi được các thay đổi đang chờ: {write_queue.last_error}")
+
+    # No status write may land between reading the rows and deleting them: it
+    # would be lost with the deleted row. A change queued meanwhile is written
+    # after the delete, where it is reported as a conflict for archived leaves.
+    with get_archive_lock(), write_queue.flush_lock():
+        values = _fetch_values(LEAVE_SHEET_ID, LEAVE_SHEET_RANGE, priority=PRIORITY_WRITE)
+        if not values:
+            raise RuntimeError("Không đọc được dữ liệu nghỉ phép.")
+        headers = values[0]
+        leave_df = prepare_leave_frame(_values_frame(values))
+        closed = leave_archive.closed_rows(leave_df, leave_archive.hot_start(LEAVE_HOT_YEARS))
+        closed = closed[(leave_df.loc[closed, RECORD_ID_COLUMN] != "").to_numpy()]  # IDs are checked before deleting
+        if closed.empty:
+            return {}
+
+        years = leave_df.loc[closed, 'ngayDangKy'].dt.year
+        by_year = {int(year): list(indexes) for year, indexes in years.groupby(years).groups.items()}
+        tabs = _fetch_leave_tabs(PRIORITY_WRITE)
+        missing_tabs = [leave_archive.archive_tab(year) for year in by_year if leave_archive.archive_tab(year) not in tabs]
+        if missing_tabs:
+            # Sent once: a retried addSheet fails if the first one was applied,
+            # and the next run finds the tabs anyway
+            _execute(
+                "sheets.write",
+                get_sheets_service().spreadsheets().batchUpdate(
+                    spreadsheetId=LEAVE_SHEET_ID,
+                    body={"requests": [{"addSheet": {"properties": {"title": title}}} for title in missing_tabs]}
+                ),
+                priority=PRIORITY_WRITE,
+                max_retries=1
+            )
+
+        archived = {}
+        for year, indexes in by_year.items():
+            tab = leave_archive.archive_tab(year)
+            existing = [] if tab in missing_tabs else _fetch_values(LEAVE_SHEET_ID, tab, priority=PRIORITY_WRITE)
+            if existing is None:
+                raise RuntimeError(f"Không đọc được {tab}.")
+
+            # Skip leaves an interrupted run already copied
+            done = set()
+            if existing and RECORD_ID_COLUMN in existing[0]:
+                id_index = existing[0].index(RECORD_ID_COLUMN)
+                done = {row[id_index] for row in existing[1:] if len(row) > id_index}
+            rows = [
+                values[index + 1] + [""] * (len(headers) - len(values[index + 1]))
+                for index in indexes if leave_df.at[index, RECORD_ID_COLUMN] not in done
+            ]
+            if not existing:
+                rows = [headers] + rows
+            if rows:
+                # Sent once: the next run skips what a lost response still copied
+                _execute(
+                    "sheets.append",
+                    get_sheets_service().spreadsheets().values().append(
+                        spreadsheetId=LEAVE_SHEET_ID,
+                        range=tab,
+                        valueInputOption="RAW",  # Copy the cells as they are
+                        insertDataOption="INSERT_ROWS",
+                        body={'values': rows}
+                    ),
+                    priority=PRIORITY_WRITE,
+                    max_retries=1
+                )
+            archived[year] = len(indexes)
+
+        # Rows only move up when rows above them are deleted, and only this
+        # function deletes: before every attempt, check that each row still
+        # holds the same leave. A delete whose response was lost has already
+        # removed them, so it is never sent blindly again.
+        letter = column_letter(LEAVE_COLUMNS.index(RECORD_ID_COLUMN) + 1)
+        archived_ids = leave_df.loc[closed, RECORD_ID_COLUMN]
+        for attempt in range(ARCHIVE_DELETE_ATTEMPTS):
+            id_values = _fetch_values(LEAVE_SHEET_ID, f"{LEAVE_SHEET_RANGE}!{letter}2:{letter}", priority=PRIORITY_WRITE)
+            if id_values is None:
+                raise RuntimeError("Không đọc được mã phép để kiểm tra trước khi xóa.")
+            current = [row[0] if row else "" for row in id_values]
+            if attempt > 0 and archived_ids.isin(current).sum() == 0:
+                break  # The previous attempt was applied
+            if any(index >= len(current) or current[index] != record_id for index, record_id in archived_ids.items()):
+                raise RuntimeError("Dữ liệu nghỉ phép đã thay đổi trong khi lưu trữ; vui lòng thử lại.")
+
+            try:
+                _execute(
+                    "sheets.write",
+                    get_sheets_service().spreadsheets().batchUpdate(
+                        spreadsheetId=LEAVE_SHEET_ID,
+                        body={"requests": leave_archive.delete_rows_requests(tabs[LEAVE_SHEET_RANGE], closed)}
+                    ),
+                    priority=PRIORITY_WRITE,
+                    max_retries=1
+                )
+                break
+            except Exception as e:
+                if not is_retryable(e) or attempt + 1 >= ARCHIVE_DELETE_ATTEMPTS:
+                    raise
+                time.sleep(2 ** attempt)
+
+    # Every row below the first deleted one has moved: read the leave tab again
+    if LEAVE_INCREMENTAL_SYNC:
+        get_leave_sync().reset()
+    invalidate_sheet_data(LEAVE_SHEET_ID, LEAVE_SHEET_RANGE)
+    get_sheet_cache().invalidate(_leave_tabs_key())
+    for year in archived:
+        get_sheet_cache().invalidate(_sheet_cache_key(LEAVE_SHEET_ID, leave_archive.archive_tab(year)))
+    return archived
+
+
+def _typed_leave_frame(raw_df):
+    if raw_df is None:
+        return prepare_leave_frame(pd.DataFrame(columns=LEAVE_COLUMNS))
+    return get_typed_frame_cache().get(raw_df)
+
+
+def _leave_source():
+    """Return (mirror, None) when the mirror is usable, else (None, typed leave frame)."""
+    raw_df = _cached_sheet_data(LEAVE_SHEET_ID, LEAVE_SHEET_RANGE)  # Also keeps the mirror in sync
+    mirror = get_leave_mirror()
+    if mirror is not None and mirror.has_leaves():
+        return mirror, None
+    return None, _typed_leave_frame(raw_df)
+
+
+def query_all_leaves(start_date, end_date):
+    def select(leave_df):
+        return leave_df[
+            (leave_df['HuyPhep'] == "") &
+            (leave_df['ngayDangKy'] >= pd.Timestamp(start_date)) &
+            (leave_df['ngayDangKy'] <= pd.Timestamp(end_date))
+        ]
+
+    mirror, leave_df = _leave_source()
+    if mirror is not None:
+        leaves = prepare_leave_frame(mirror.all_leaves(start_date, end_date))
+    else:
+        leaves = select(leave_df)
+    return _with_archives(leaves, start_date, end_date, select)
+
+
+def query_user_leaves(maNVYT, start_date=None, end_date=None):
+    """All leaves of `maNVYT` in the leave tab, plus those of the archived
+    years that [start_date, end_date] reaches."""
+    mirror, leave_df = _leave_source()
+    if mirror is not None:
+        leaves = prepare_leave_frame(mirror.user_leaves(maNVYT))
+    else:
+        leaves = leave_df[leave_df['maNVYT'] == str(maNVYT)]
+    return _with_archives(leaves, start_date, end_date, lambda df: df[df['maNVYT'] == str(maNVYT)])
+
+
+def query_pending_leaves(start_date, end_date):
+    mirror, leave_df = _leave_source()
+    if mirror is not None:
+        return prepare_leave_frame(mirror.pending_leaves(start_date, end_date))
+
+    return leave_df[
+        (leave_df['DuyetPhep'] == "") &
+        (leave_df['HuyPhep'] == "") &
+        (leave_df['ngayDangKy'] >= pd.Timestamp(start_date)) &
+        (leave_df['ngayDangKy'] <= pd.Timestamp(end_date))
+    ]
+
+
+def query_approved_leaves():
+    # Leave tab only: archived years are closed
+    mirror, leave_df = _leave_source()
+    if mirror is not None:
+        return prepare_leave_frame(mirror.approved_leaves())
+
+    return leave_df[
+        (leave_df['DuyetPhep'] == 'Duyệt') &
+        (leave_df['HuyPhep'] == "")
+    ]
+
+
+@st.cache_resource
+def get_leave_stats_cache():
+    """Per-employee half-year counters, updated once per data version."""
+    return DerivedCache(
+        perf_metrics.timed("frame.leave_stats")(LeaveStats),
+        update=perf_metrics.timed("frame.update_stats")(
+            lambda stats, old_df, leave_df, rows: stats.updated(old_df, leave_df, rows)
+        )
+    )
+
+
+def get_leave_stats():
+    return get_leave_stats_cache().get(get_leave_frame())
+
+
+@st.cache_resource
+def get_occupancy_cache():
+    """Staff off per day, updated once per data version."""
+    return DerivedCache(
+        perf_metrics.timed("frame.occupancy")(DailyOccupancy),
+        update=perf_metrics.timed("frame.update_occupancy")(
+            lambda occupancy, old_df, leave_df, rows: occupancy.updated(old_df, leave_df, rows)
+        )
+    )
+
+
+def get_occupancy(start_date=None, end_date=None):
+    """Staff off per day; built per call when [start_date, end_date] reaches archived years."""
+    archived = _archived_leave_frames(start_date, end_date)
+    if archived:
+        return DailyOccupancy(leave_archive.combine(archived + [get_leave_frame()]))
+    return get_occupancy_cache().get(get_leave_frame())
+
+
+@st.cache_resource
+def get_registration_index():
+    """Process-wide set of active registrations, used for duplicate checks."""
+    return RegistrationIndex()
+
+
+def get_active_registrations():
+    """The registration index, brought up to date with the latest leave data."""
+    registration_index = get_registration_index()
+    registration_index.update(get_leave_frame())
+    return registration_index
+
+
+@st.cache_resource
+def get_staff_index_cache():
+    """Staff lookup tables shared by all sessions, rebuilt once per staff-sheet version."""
+    return DerivedCache(perf_metrics.timed("frame.staff_index")(StaffIndex))
+
+
+def get_staff_index():
+    nhanvien_df = _cached_sheet_data(NHANVIEN_SHEET_ID, NHANVIEN_SHEET_RANGE)
+    if nhanvien_df is None:
+        nhanvien_df = pd.DataFrame()
+    return get_staff_index_cache().get(nhanvien_df)
+
+# Login helper function
+def check_login(username, password):
+    return get_staff_index().authenticate(username, password)
+
+# Display all leaves with highlighting for approved ones
+@perf_metrics.timed("page.display_all_leaves")
+def display_all_leaves():
     # Horizontal layout for date filters
     col1, col2 = st.columns(2)
     with col1:
@@ -136,207 +912,230 @@ def display_all_leaves():
             key="end_date"
         )
 
-    # Filter rows by the date range
-    filtered_leaves = leave_df[
-        (leave_df['ngayDangKy'] >= pd.Timestamp(start_date)) &
-        (leave_df['ngayDangKy'] <= pd.Timestamp(end_date))
-    ].sort_values(by=['ngayDangKy', 'thoiGianDangKy'], ascending=[True, True])  # Sort by `ngayDangKy` and then `thoiGianDangKy` ASC
-
+    # Calendar: how many staff are off on each day
+    view = st.radio("Hiển thị", ["Danh sách", "Lịch"], horizontal=True, key="all_leaves_view")
+    if view == "Lịch":
+        display_leave_calendar(start_date, end_date)
+        return
 
-    # Format dates as `dd/mm/yyyy`
-    filtered_leaves['ngayDangKy'] = filtered_leaves['ngayDangKy'].dt.strftime('%d/%m/%Y')
-    filtered_leaves['thoiGianDangKy'] = filtered_leaves['thoiGianDangKy'].dt.strftime('%d/%m/%Y %H:%M:%S')
+    # Non-cancelled leaves within the date range, sorted by `ngayDangKy` and then `thoiGianDangKy` ASC
+    filtered_leaves = query_all_leaves(start_date, end_date).sort_values(
+        by=['ngayDangKy', 'thoiGianDangKy'], ascending=[True, True]
+    )
 
-    # Rename columns for display (apply to filtered_leaves)
+    # Rename columns for display (dates use the precomputed dd/mm/yyyy strings)
     filtered_leaves = filtered_leaves.rename(columns={
         'tenNhanVien': 'Họ tên',
-        'ngayDangKy': 'Ngày đăng ký',
+        'ngayDangKy_display': 'Ngày đăng ký',
         'loaiPhep': 'Loại phép',
-        'thoiGianDangKy': 'Thời gian đăng ký',
+        'thoiGianDangKy_display': 'Thời gian đăng ký',
         'DuyetPhep': 'Duyệt'
     })
 
-    # Highlight approved and rejected leaves
-    def highlight_approved(row):
-        if row['Duyệt'] == 'Duyệt':
-            return ['background-color: lightgreen' for _ in row]
-        elif row['Duyệt'] == 'Không duyệt':
-            return ['background-color: lightcoral' for _ in row]  # Light red background
-        else:
-            return ['' for _ in row]  # No background
-
-    # Display filtered table
+    # Display filtered table, one page at a time so only the visible rows are sent
     if not filtered_leaves.empty:
-        styled_df = filtered_leaves[
-            ['Họ tên', 'Ngày đăng ký', 'Loại phép', 'Thời gian đăng ký', 'Duyệt']
-        ].style.apply(highlight_approved, axis=1)
+        total = len(filtered_leaves)
+        page_count = -(-total // ALL_LEAVES_PAGE_SIZE)
+        page = 1
+        if page_count > 1:
+            page = st.number_input(
+                f"Trang (1-{page_count})", min_value=1, max_value=page_count, value=1, step=1,
+                key=f"all_leaves_page_{start_date}_{end_date}"  # Back to page 1 when the range changes
+            )
+        first = (page - 1) * ALL_LEAVES_PAGE_SIZE
+        page_leaves = filtered_leaves.iloc[first:first + ALL_LEAVES_PAGE_SIZE]
+        st.caption(f"Hiển thị {first + 1}-{first + len(page_leaves)} / {total} đăng ký.")
+
+        table = page_leaves[['Họ tên', 'Ngày đăng ký', 'Loại phép', 'Thời gian đăng ký', 'Duyệt']]
+
+        # Highlight approved and rejected leaves: one background per row, spread over all columns
+        row_styles = page_leaves['Duyệt'].astype(str).map(STATUS_STYLES).fillna("")
+        styles = pd.DataFrame(
+            np.repeat(row_styles.to_numpy()[:, None], len(table.columns), axis=1),
+            index=table.index, columns=table.columns
+        )
 
         # Make the table larger
-        st.dataframe(styled_df, use_container_width=True, hide_index = True, height=600)
+        st.dataframe(
+            table.style.apply(lambda _: styles, axis=None),
+            use_container_width=True, hide_index = True, height=600
+        )
     else:
         st.write("Không có đăng ký phép nào trong khoảng thời gian này.")
 
 
 
-# Display user's leaves with the ability to cancel
-def display_user_leaves():
-    # Fetch leave data
-    leave_df = fetch_sheet_data(LEAVE_SHEET_ID, LEAVE_SHEET_RANGE)
-    user_info = st.session_state['user_info']
-
-    # Ensure the maNVYT column exists and filter data by the logged-in user's maNVYT
-    if 'maNVYT' in leave_df.columns:
-        # Convert both to strings for consistent comparison
-        leave_df['maNVYT'] = leave_df['maNVYT'].astype(str)
-        user_maNVYT = str(user_info['maNVYT'])
-        user_leaves = leave_df[leave_df['maNVYT'] == user_maNVYT]
-    else:
-        st.error("Column 'maNVYT' is missing in the Google Sheet.")
+@perf_metrics.timed("page.display_leave_calendar")
+def display_leave_calendar(start_date, end_date):
+    approved_only = st.checkbox("Chỉ tính phép đã duyệt", key="calendar_approved_only")
+    daily = get_occupancy(start_date, end_date).daily(start_date, end_date, approved_only)
+    if daily.empty or not daily['Tổng'].any():
+        st.write("Không có đăng ký phép nào trong khoảng thời gian này.")
         return
 
-    if not user_leaves.empty:
-        # Convert 'ngayDangKy' to datetime format
-        user_leaves['ngayDangKy'] = pd.to_datetime(user_leaves['ngayDangKy'], errors='coerce')
+    months = daily.index.to_period('M').unique().tolist()
+    month = st.selectbox("Tháng", months, format_func=lambda m: m.strftime('%m/%Y'), key="calendar_month")
+    month_days = daily[daily.index.to_period('M') == month]
+    totals = month_days['Tổng']
+
+    # One row per week (Monday first), one column per weekday
+    first_weekday = month.start_time.dayofweek
+    rows = (totals.index.day - 1 + first_weekday) // 7
+    rows = rows - rows.min()  # The range may start mid-month
+    cols = totals.index.dayofweek
+    text = np.full((rows.max() + 1, 7), "", dtype=object)
+    styles = np.full((rows.max() + 1, 7), "", dtype=object)
+
+    peak = totals.max()
+    text[rows, cols] = totals.index.strftime('%d') + " · " + totals.map('{:g}'.format)
+    alpha = (totals / peak if peak else totals).round(2).astype(str)
+    styles[rows, cols] = np.where(totals > 0, "background-color: rgba(220, 53, 69, " + alpha + ")", "")
+
+    weekdays = ["T2", "T3", "T4", "T5", "T6", "T7", "CN"]
+    calendar = pd.DataFrame(text, columns=weekdays)
+    calendar_styles = pd.DataFrame(styles, columns=weekdays)
+    st.write(f"### Số nhân viên nghỉ theo ngày ({month.strftime('%m/%Y')}):")
+    st.dataframe(
+        calendar.style.apply(lambda _: calendar_styles, axis=None),
+        use_container_width=True, hide_index=True
+    )
+    if peak:
+        busiest = totals[totals == peak].index.strftime('%d/%m/%Y')
+        st.caption(f"Nhiều nhất {peak:g} người nghỉ: {', '.join(busiest)}. Nửa ngày (Sáng/Chiều) tính 0.5.")
 
-        # Filter out rows where 'ngayDangKy' could not be converted
-        user_leaves = user_leaves[user_leaves['ngayDangKy'].notna()]
+    # Split by leave type
+    st.bar_chart(month_days.drop(columns='Tổng').loc[:, lambda df: (df != 0).any()])
 
-        # Format 'ngayDangKy' as dd/MM/yyyy
-        user_leaves['ngayDangKy_display'] = user_leaves['ngayDangKy'].dt.strftime('%d/%m/%Y')
 
-        # Rename columns for display
-        user_leaves = user_leaves.rename(columns={
-            'tenNhanVien': 'Họ tên',
-            'ngayDangKy_display': 'Ngày đăng ký',
-            'loaiPhep': 'Loại phép',
-            'thoiGianDangKy': 'Thời gian đăng ký',
-            'DuyetPhep': 'Duyệt',
-            'HuyPhep': 'Hủy phép',
-            'nguoiHuy': 'Người hủy'
-        })
+# Display user's leaves with the ability to cancel
+@perf_metrics.timed("page.display_user_leaves")
+def display_user_leaves():
+    show_flash_message()
+    user_info = st.session_state['user_info']
+    user_maNVYT = str(user_info['maNVYT'])
 
-        # Date filter
-        st.write("### Lọc theo thời gian:")
-        col1, col2 = st.columns(2)
-        current_year = pd.Timestamp.now().year
-        with col1:
-            start_date = st.date_input(
-                "Ngày bắt đầu",
-                value=pd.Timestamp(year=current_year, month=1, day=1),
-                key="start_date"
-            )
-        with col2:
-            end_date = st.date_input(
-                "Ngày kết thúc",
-                value=pd.Timestamp(year=current_year, month=12, day=31),
-                key="end_date"
-            )
+    # maPhep of the user's leaves in the leave tab (archived ones cannot be cancelled)
+    hot_record_ids = query_user_leaves(user_maNVYT)[RECORD_ID_COLUMN]
 
-        # Filter leaves within the selected date range
-        filtered_leaves = user_leaves[
-            (user_leaves['ngayDangKy'] >= pd.Timestamp(start_date)) &
-            (user_leaves['ngayDangKy'] <= pd.Timestamp(end_date))
-        ]
+    # Column names for display
+    display_columns = {
+        'tenNhanVien': 'Họ tên',
+        'ngayDangKy_display': 'Ngày đăng ký',
+        'loaiPhep': 'Loại phép',
+        'thoiGianDangKy_display': 'Thời gian đăng ký',
+        'DuyetPhep': 'Duyệt',
+        'HuyPhep': 'Hủy phép',
+        'nguoiHuy': 'Người hủy'
+    }
+
+    # Date filter, always shown: older leaves may all be in the archive tabs
+    st.write("### Lọc theo thời gian:")
+    col1, col2 = st.columns(2)
+    current_year = pd.Timestamp.now().year
+    with col1:
+        start_date = st.date_input(
+            "Ngày bắt đầu",
+            value=pd.Timestamp(year=current_year, month=1, day=1),
+            key="start_date"
+        )
+    with col2:
+        end_date = st.date_input(
+            "Ngày kết thúc",
+            value=pd.Timestamp(year=current_year, month=12, day=31),
+            key="end_date"
+        )
 
-        # Display filtered leaves
-        st.write("### Danh sách phép của bạn:")
-        if not filtered_leaves.empty:
-            st.dataframe(
-                filtered_leaves[['Họ tên', 'Ngày đăng ký', 'Loại phép', 'Thời gian đăng ký', 'Duyệt', 'Hủy phép']],
-                use_container_width=True, hide_index = True
-            )
-        else:
-            st.write("Không có phép nào được đăng ký trong khoảng thời gian này.")
-
-        # Calculate max cancellations for the first and second 6-month periods
-        first_half_start = pd.Timestamp(year=current_year, month=1, day=1)
-        first_half_end = pd.Timestamp(year=current_year, month=6, day=30)
-        second_half_start = pd.Timestamp(year=current_year, month=7, day=1)
-        second_half_end = pd.Timestamp(year=current_year, month=12, day=31)
-
-        # Count cancellations in each period
-        first_half_cancellations = filtered_leaves[
-            (filtered_leaves['Hủy phép'] == 'Hủy') &
-            (filtered_leaves['Người hủy'] == user_maNVYT) &
-            (filtered_leaves['ngayDangKy'] >= first_half_start) &
-            (filtered_leaves['ngayDangKy'] <= first_half_end)
-        ].shape[0]
-
-        second_half_cancellations = filtered_leaves[
-            (filtered_leaves['Hủy phép'] == 'Hủy') &
-            (filtered_leaves['Người hủy'] == user_maNVYT) &
-            (filtered_leaves['ngayDangKy'] >= second_half_start) &
-            (filtered_leaves['ngayDangKy'] <= second_half_end)
-        ].shape[0]
-
-        max_cancellations_per_period = 2  # Easy to change cancellation limit here
-
-        # Display cancellation limits for both periods
-        if filtered_leaves['ngayDangKy'].between(first_half_start, first_half_end).any():
-            st.write(
-                f"Trong 6 tháng đầu năm, bạn đã hủy {first_half_cancellations} lần. "
-                f"Bạn có thể hủy thêm {max(0, max_cancellations_per_period - first_half_cancellations)} lần."
-            )
+    # Filter leaves within the selected date range (archived years are read only if it reaches them)
+    filtered_leaves = query_user_leaves(user_maNVYT, start_date, end_date).rename(columns=display_columns)
+    filtered_leaves = filtered_leaves[
+        filtered_leaves['ngayDangKy'].notna() &
+        (filtered_leaves['ngayDangKy'] >= pd.Timestamp(start_date)) &
+        (filtered_leaves['ngayDangKy'] <= pd.Timestamp(end_date))
+    ]
 
-        if filtered_leaves['ngayDangKy'].between(second_half_start, second_half_end).any():
+    # Display filtered leaves
+    st.write("### Danh sách phép của bạn:")
+    if not filtered_leaves.empty:
+        st.dataframe(
+            filtered_leaves[['Họ tên', 'Ngày đăng ký', 'Loại phép', 'Thời gian đăng ký', 'Duyệt', 'Hủy phép']],
+            use_container_width=True, hide_index = True
+        )
+    else:
+        st.write("Không có phép nào được đăng ký trong khoảng thời gian này.")
+
+    # Counters for the current year, independent of the date filter above
+    leave_stats = get_leave_stats()
+    max_cancellations_per_period = 2  # Easy to change cancellation limit here
+
+    summary = {}
+    for half, period in ((1, "6 tháng đầu năm"), (2, "6 tháng cuối năm")):
+        counters = leave_stats.get(user_maNVYT, current_year, half)
+        cancellations = counters['self_cancellations']
+        if counters['registrations'] or cancellations or counters['admin_cancellations']:
+            summary[period] = {
+                **counters['registrations'],
+                'Ngày phép đã duyệt': counters['approved_days'],
+                'Tự hủy': cancellations,
+                'Bị hủy bởi quản lý': counters['admin_cancellations']
+            }
+
+            # Display cancellation limits for both periods
             st.write(
-                f"Trong 6 tháng cuối năm, bạn đã hủy {second_half_cancellations} lần. "
-                f"Bạn có thể hủy thêm {max(0, max_cancellations_per_period - second_half_cancellations)} lần."
+                f"Trong {period}, bạn đã hủy {cancellations} lần. "
+                f"Bạn có thể hủy thêm {max(0, max_cancellations_per_period - cancellations)} lần."
             )
 
-        # Allow user to cancel if within limit
-        total_cancellations = first_half_cancellations + second_half_cancellations
-        if total_cancellations < max_cancellations_per_period:
-            # Filter leaves where 'Hủy phép' is empty
-            cancellable_leaves = filtered_leaves[filtered_leaves['Hủy phép'].isnull() | (filtered_leaves['Hủy phép'] == "")]
-            
-            if not cancellable_leaves.empty:
-                cancel_row = st.selectbox(
-                    "Chọn dòng để hủy:",
-                    cancellable_leaves.index,
-                    format_func=lambda x: f"Ngày đăng ký: {cancellable_leaves.loc[x, 'Ngày đăng ký']}"
-                )
+    if summary:
+        st.write(f"### Tổng hợp năm {current_year}:")
+        st.dataframe(pd.DataFrame(summary).fillna(0).T.convert_dtypes(), use_container_width=True)
 
-                if st.button("Hủy phép"):
-                    # Update the specific row in the Google Sheet
-                    row_index = cancel_row + 2  # Account for 1-based indexing in Google Sheets and header row
-                    sheets_service.spreadsheets().values().update(
-                        spreadsheetId=LEAVE_SHEET_ID,
-                        range=f"Sheet1!G{row_index}:H{row_index}",
-                        valueInputOption="RAW",
-                        body={"values": [["Hủy", user_maNVYT]]}  # Update HuyPhep and nguoiHuy columns
-                    ).execute()
-                    
-                    # Refresh the data
-                    leave_df = fetch_sheet_data(LEAVE_SHEET_ID, LEAVE_SHEET_RANGE)
-                    user_leaves = leave_df[leave_df['maNVYT'] == user_maNVYT]
-                    
-                    # Reapply filtering
-                    user_leaves['ngayDangKy'] = pd.to_datetime(user_leaves['ngayDangKy'], errors='coerce')
-                    user_leaves = user_leaves[user_leaves['ngayDangKy'].notna()]
-                    user_leaves['ngayDangKy_display'] = user_leaves['ngayDangKy'].dt.strftime('%d/%m/%Y')
-                    filtered_leaves = user_leaves[
-                        (user_leaves['ngayDangKy'] >= pd.Timestamp(start_date)) &
-                        (user_leaves['ngayDangKy'] <= pd.Timestamp(end_date))
-                    ]
-                    
-                    # Refresh the displayed table
-                    st.success("Đã hủy phép thành công.")
-                    st.dataframe(
-                        filtered_leaves[['Họ tên', 'Ngày đăng ký', 'Loại phép', 'Thời gian đăng ký', 'Duyệt', 'Hủy phép']],
-                        use_container_width=True, hide_index=True
-                    )
+    def within_limit(day):
+        return leave_stats.get(user_maNVYT, *half_of(day))['self_cancellations'] < max_cancellations_per_period
 
-            else:
-                st.warning("Không có phép nào có thể hủy.")
-        else:
-            st.warning("Bạn đã đạt giới hạn hủy phép trong giai đoạn này.")
+    # Leaves that are not cancelled (nor archived), in a half-year where the limit is not reached
+    not_cancelled = (
+        (filtered_leaves['Hủy phép'] == "") &
+        (filtered_leaves[RECORD_ID_COLUMN] != "") &  # Rows typed into the sheet get their maPhep on the next read
+        filtered_leaves[RECORD_ID_COLUMN].isin(hot_record_ids)
+    )
+    cancellable_leaves = filtered_leaves[
+        not_cancelled &
+        filtered_leaves['ngayDangKy'].map(within_limit).astype(bool)  # map keeps the dtype when empty
+    ]
+    if not cancellable_leaves.empty:
+        cancel_row = st.selectbox(
+            "Chọn dòng để hủy:",
+            cancellable_leaves.index,
+            format_func=lambda x: f"Ngày đăng ký: {cancellable_leaves.loc[x, 'Ngày đăng ký']}"
+        )
+
+        if st.button("Hủy phép"):
+            # Queue the update of the record in the Google Sheet (only if it is still not cancelled)
+            record_id = cancellable_leaves.loc[cancel_row, RECORD_ID_COLUMN]
+            queue_status_update(record_id, {"HuyPhep": "Hủy", "nguoiHuy": user_maNVYT}, {"HuyPhep": ""})
+            flash_and_rerun("success", "Đã hủy phép thành công.")
+    elif not_cancelled.any():
+        st.warning("Bạn đã đạt giới hạn hủy phép trong giai đoạn này.")
     else:
-        st.write("Không có phép nào được đăng ký bởi bạn.")
+        st.warning("Không có phép nào có thể hủy.")
 
 
 
+def registration_days(start_date, end_date, skip_weekends, skip_holidays):
+    """Days from `start_date` to `end_date` (inclusive) to register, in order."""
+    days = pd.date_range(start_date, end_date, freq='D')
+    if skip_weekends:
+        days = days[days.dayofweek < 5]
+    if skip_holidays:
+        days = days[
+            ~days.strftime('%m-%d').isin(PUBLIC_HOLIDAYS) &
+            ~days.strftime('%Y-%m-%d').isin(EXTRA_HOLIDAYS)
+        ]
+    return [day.date() for day in days]
+
+
 # Registration form for leaves
+@perf_metrics.timed("page.display_registration_form")
 def display_registration_form():
     user_info = st.session_state['user_info']
     current_date = datetime.now().date()
@@ -349,14 +1148,30 @@ def display_registration_form():
         min_date = datetime(current_date.year, 7, 1).date()
         max_date = datetime(current_date.year + 1, 1, 31).date()
 
-    # Restrict date input to the defined range
-    registration_date = st.date_input(
-        "Ngày đăng ký",
-        value=min_date,
-        min_value=min_date,
-        max_value=max_date,
-        key="registration_date"
-    )
+    # Several days (e.g. a week off) can be registered in one go
+    multi_day = st.toggle("Đăng ký nhiều ngày", key="multi_day")
+    if multi_day:
+        date_range = st.date_input(
+            "Khoảng ngày đăng ký",
+            value=(min_date, min_date),
+            min_value=min_date,
+            max_value=max_date,
+            key="registration_range"
+        )
+        col1, col2 = st.columns(2)
+        with col1:
+            skip_weekends = st.checkbox("Bỏ qua thứ Bảy, Chủ nhật", value=True, key="skip_weekends")
+        with col2:
+            skip_holidays = st.checkbox("Bỏ qua ngày lễ", value=True, key="skip_holidays")
+    else:
+        # Restrict date input to the defined range
+        registration_date = st.date_input(
+            "Ngày đăng ký",
+            value=min_date,
+            min_value=min_date,
+            max_value=max_date,
+            key="registration_date"
+        )
 
     st.write("### Chọn loại phép:")
     leave_type = st.selectbox(
@@ -366,8 +1181,19 @@ def display_registration_form():
     )
 
     if st.button("Xác nhận đăng ký"):
-        # Re-validate the selected date
-        if not (min_date <= registration_date <= max_date):
+        if multi_day:
+            if len(date_range) != 2:
+                st.error("Vui lòng chọn ngày bắt đầu và ngày kết thúc.")
+                return
+            registration_dates = registration_days(*date_range, skip_weekends, skip_holidays)
+            if not registration_dates:
+                st.warning("Không có ngày nào cần đăng ký trong khoảng đã chọn.")
+                return
+        else:
+            registration_dates = [registration_date]
+
+        # Re-validate the selected dates
+        if not all(min_date <= day <= max_date for day in registration_dates):
             st.error(
                 f"Ngày đăng ký không hợp lệ. Vui lòng chọn trong khoảng từ {min_date.strftime('%d/%m/%Y')} đến {max_date.strftime('%d/%m/%Y')}."
             )
@@ -375,59 +1201,60 @@ def display_registration_form():
 
         timestamp = datetime.now(pytz.timezone("Asia/Ho_Chi_Minh")).strftime("%Y-%m-%d %H:%M:%S")
 
-        # Fetch existing registrations to check for duplicates
-        leave_df = fetch_sheet_data(LEAVE_SHEET_ID, LEAVE_SHEET_RANGE)
-        user_registrations = leave_df[
-            (leave_df['maNVYT'] == str(user_info['maNVYT'])) &
-            (leave_df['ngayDangKy'] == str(registration_date)) &
-            (leave_df['loaiPhep'] == leave_type)
-        ]
-
-        if not user_registrations.empty:
-            existing_dates = user_registrations['ngayDangKy'].tolist()
-            st.warning(f"Bạn đã đăng ký {leave_type} cho ngày: {', '.join(existing_dates)}. Vui lòng kiểm tra lại.")
-            return
-
-        # New registration data
-        new_registration = [
-            [
-                str(user_info['maNVYT']),  # Ensure maNVYT is stored as a string
-                user_info['tenNhanVien'],
-                str(registration_date),
-                leave_type,
-                timestamp,
-                "",  # DuyetPhep column (default empty)
-                "",  # HuyPhep column (default empty)
-                ""   # nguoiHuy column (default empty)
+        def append_registrations(keys):
+            # New registration data, one row per day, written by a single append
+            new_registrations = [
+                [
+                    str(user_info['maNVYT']),  # Ensure maNVYT is stored as a string
+                    user_info['tenNhanVien'],
+                    day,
+                    leave_type,
+                    timestamp,
+                    "",  # DuyetPhep column (default empty)
+                    "",  # HuyPhep column (default empty)
+                    "",  # nguoiHuy column (default empty)
+                    new_record_id()  # maPhep column (stable ID of the record)
+                ]
+                for _, day, _ in keys
             ]
-        ]
+            append_to_sheet(LEAVE_SHEET_ID, LEAVE_SHEET_RANGE, new_registrations)
 
+        # Check for duplicates and reserve the days under one process-wide lock
+        keys = [registration_key(user_info['maNVYT'], day, leave_type) for day in registration_dates]
         try:
-            append_to_sheet(LEAVE_SHEET_ID, LEAVE_SHEET_RANGE, new_registration)
-            st.success("Đăng ký thành công!")
+            added, duplicates = get_active_registrations().register(keys, append_registrations)
         except Exception as e:
             st.error(f"Lỗi khi ghi dữ liệu: {e}")
+            return
+
+        if duplicates:
+            existing_dates = [day for _, day, _ in duplicates]
+            st.warning(f"Bạn đã đăng ký {leave_type} cho ngày: {', '.join(existing_dates)}. Vui lòng kiểm tra lại.")
+        if len(added) == 1:
+            st.success("Đăng ký thành công!")
+        elif added:
+            st.success(f"Đăng ký thành công {len(added)} ngày: {', '.join(day for _, day, _ in added)}.")
 
 
 
-# Admin approval page
-def admin_approval_page():
-    # Fetch leave data
-    leave_df = fetch_sheet_data(LEAVE_SHEET_ID, LEAVE_SHEET_RANGE)
+def with_staffing(pending_leaves, min_on_duty):
+    """Add `daDuyetCungNgay` (approved staff off on the same day) and `thieuNguoi`
+    (approving would leave fewer than `min_on_duty` staff at work) to pending leaves.
 
-    # Ensure required columns exist
-    required_columns = ['maNVYT', 'tenNhanVien', 'ngayDangKy', 'loaiPhep', 'thoiGianDangKy', 'DuyetPhep', 'HuyPhep']
-    for col in required_columns:
-        if col not in leave_df.columns:
-            leave_df[col] = ""  # Add missing columns with default values
+    Looked up for all rows at once in the per-day totals of approved leaves.
+    """
+    approved_off = get_occupancy().approved_off(pending_leaves['ngayDangKy'])
+    on_duty = len(get_staff_index()) - approved_off - pending_leaves['soNgay']
+    return pending_leaves.assign(daDuyetCungNgay=approved_off, thieuNguoi=on_duty < min_on_duty)
 
-    # Convert `ngayDangKy` and `thoiGianDangKy` to datetime for filtering and formatting
-    leave_df['ngayDangKy'] = pd.to_datetime(leave_df['ngayDangKy'], errors='coerce')
-    leave_df['thoiGianDangKy'] = pd.to_datetime(leave_df['thoiGianDangKy'], errors='coerce')
 
-    # Format `ngayDangKy` as `dd/MM/yyyy` and `thoiGianDangKy` as `dd/MM/yyyy HH:mm:ss`
-    leave_df['ngayDangKy_display'] = leave_df['ngayDangKy'].dt.strftime('%d/%m/%Y')
-    leave_df['thoiGianDangKy_display'] = leave_df['thoiGianDangKy'].dt.strftime('%d/%m/%Y %H:%M:%S')
+# Admin approval page
+@perf_metrics.timed("page.admin_approval_page")
+def admin_approval_page():
+    # The page is built from one snapshot of the pending leaves per render; a
+    # write reruns the page instead of re-fetching inside the row loop
+    show_flash_message()
+    display_pending_writes()
 
     # Side-by-side layout for date filters
     col1, col2 = st.columns(2)
@@ -440,13 +1267,18 @@ def admin_approval_page():
             key="end_date"
         )
 
-    # Filter rows where `DuyetPhep` and `HuyPhep` are empty, and `ngayDangKy` falls within the selected range
-    filtered_leaves = leave_df[
-        (leave_df['DuyetPhep'] == "") & 
-        (leave_df['HuyPhep'] == "") & 
-        (leave_df['ngayDangKy'] >= pd.to_datetime(start_date)) & 
-        (leave_df['ngayDangKy'] <= pd.to_datetime(end_date))
-    ].sort_values(by='ngayDangKy', ascending=True)  # Sort by `ngayDangKy` ASC
+    min_on_duty = st.number_input(
+        "Số nhân viên tối thiểu mỗi ngày", min_value=0, value=MIN_STAFF_ON_DUTY, step=1, key="min_on_duty"
+    )
+
+    # Rows where `DuyetPhep` and `HuyPhep` are empty, and `ngayDangKy` falls within the selected range
+    filtered_leaves = query_pending_leaves(start_date, end_date).sort_values(by='ngayDangKy', ascending=True)  # Sort by `ngayDangKy` ASC
+    filtered_leaves = with_staffing(filtered_leaves, min_on_duty)
+
+    # Bulk mode: pick many requests in a table and approve/reject them together
+    if st.toggle("Duyệt hàng loạt", key="bulk_mode"):
+        admin_bulk_approval(filtered_leaves)
+        return
 
     st.write("### Danh sách đăng ký phép (Chưa duyệt):")
     if not filtered_leaves.empty:
@@ -457,81 +1289,202 @@ def admin_approval_page():
                 **Họ tên:** {row['tenNhanVien']}  
                 **Ngày đăng ký:** {row['ngayDangKy_display']}  
                 **Loại phép:** {row['loaiPhep']}  
-                **Thời gian đăng ký:** {row['thoiGianDangKy_display']}
+                **Thời gian đăng ký:** {row['thoiGianDangKy_display']}  
+                **Đã duyệt cùng ngày:** {row['daDuyetCungNgay']:g} người nghỉ
             """)
+            if row['thieuNguoi']:
+                st.warning(f"⚠️ Nếu duyệt, ngày {row['ngayDangKy_display']} sẽ còn dưới {min_on_duty} nhân viên làm việc.")
+
+            # A row typed into the sheet gets its maPhep on the next read
+            has_id = row[RECORD_ID_COLUMN] != ""
+            if not has_id:
+                st.caption("Đăng ký này chưa có mã phép; vui lòng tải lại trang sau ít phút để duyệt.")
 
             col1, col2 = st.columns(2)
             with col1:
                 # "Duyệt" button
-                if st.button("Duyệt", key=f"approve_{index}"):
-                    # Update the specific row in the Google Sheet
-                    row_index = index + 2  # Account for 1-based indexing in Google Sheets and header row
-                    sheets_service.spreadsheets().values().update(
-                        spreadsheetId=LEAVE_SHEET_ID,
-                        range=f"Sheet1!F{row_index}:F{row_index}",
-                        valueInputOption="RAW",
-                        body={"values": [["Duyệt"]]} 
-                    ).execute()
-                    st.success(f"Duyệt thành công cho {row['tenNhanVien']}")
+                if st.button("Duyệt", key=f"approve_{index}", disabled=not has_id):
+                    # Queue the update of the record in the Google Sheet (only if it is still pending)
+                    queue_status_update(row[RECORD_ID_COLUMN], {"DuyetPhep": "Duyệt"}, PENDING_STATE)
+                    flash_and_rerun("success", f"Duyệt thành công cho {row['tenNhanVien']}")
 
             with col2:
                 # "Không duyệt" button
-                if st.button("Không duyệt", key=f"reject_{index}"):
-                    # Update the specific row in the Google Sheet
-                    row_index = index + 2  # Account for 1-based indexing in Google Sheets and header row
-                    sheets_service.spreadsheets().values().update(
-                        spreadsheetId=LEAVE_SHEET_ID,
-                        range=f"Sheet1!F{row_index}:F{row_index}",
-                        valueInputOption="RAW",
-                        body={"values": [["Không duyệt"]]} 
-                    ).execute()
-                    st.success(f"Không duyệt thành công cho {row['tenNhanVien']}")
-
-                # Re-fetch data to show updated table without refreshing the page
-                leave_df = fetch_sheet_data(LEAVE_SHEET_ID, LEAVE_SHEET_RANGE)
-                leave_df['ngayDangKy'] = pd.to_datetime(leave_df['ngayDangKy'], errors='coerce')
-                leave_df['thoiGianDangKy'] = pd.to_datetime(leave_df['thoiGianDangKy'], errors='coerce')
-                leave_df['ngayDangKy_display'] = leave_df['ngayDangKy'].dt.strftime('%d/%m/%Y')
-                leave_df['thoiGianDangKy_display'] = leave_df['thoiGianDangKy'].dt.strftime('%d/%m/%Y %H:%M:%S')
-                filtered_leaves = leave_df[
-                    (leave_df['DuyetPhep'] == "") & 
-                    (leave_df['HuyPhep'] == "") & 
-                    (leave_df['ngayDangKy'] >= pd.to_datetime(start_date)) & 
-                    (leave_df['ngayDangKy'] <= pd.to_datetime(end_date))
-                ].sort_values(by='ngayDangKy', ascending=True)  # Re-apply filters
+                if st.button("Không duyệt", key=f"reject_{index}", disabled=not has_id):
+                    # Queue the update of the record in the Google Sheet (only if it is still pending)
+                    queue_status_update(row[RECORD_ID_COLUMN], {"DuyetPhep": "Không duyệt"}, PENDING_STATE)
+                    flash_and_rerun("success", f"Không duyệt thành công cho {row['tenNhanVien']}")
     else:
         st.write("Không có đăng ký phép nào trong khoảng thời gian này.")
 
 
 
+def admin_bulk_approval(filtered_leaves):
+    # Extra filters on top of the date range
+    col1, col2 = st.columns(2)
+    with col1:
+        employee_options = sorted(filtered_leaves['tenNhanVien'].unique().tolist())
+        employee_filter = st.selectbox("Nhân viên", options=["Tất cả"] + employee_options, key="bulk_employee")
+    with col2:
+        type_options = sorted(filtered_leaves['loaiPhep'].unique().tolist())
+        type_filter = st.multiselect("Loại phép", options=type_options, key="bulk_leave_type")
+
+    if employee_filter != "Tất cả":
+        filtered_leaves = filtered_leaves[filtered_leaves['tenNhanVien'] == employee_filter]
+    if type_filter:
+        filtered_leaves = filtered_leaves[filtered_leaves['loaiPhep'].isin(type_filter)]
+
+    st.write("### Danh sách đăng ký phép (Chưa duyệt):")
+    # Rows typed into the sheet get their maPhep on the next read; until then they cannot be selected
+    without_id = filtered_leaves[RECORD_ID_COLUMN] == ""
+    if without_id.any():
+        st.caption(f"{without_id.sum()} đăng ký chưa có mã phép được ẩn; vui lòng tải lại trang sau ít phút.")
+        filtered_leaves = filtered_leaves[~without_id]
+    if filtered_leaves.empty:
+        st.write("Không có đăng ký phép nào trong khoảng thời gian này.")
+        return
+
+    select_all = st.checkbox("Chọn tất cả", key="bulk_select_all")
+    table = pd.DataFrame({
+        'Chọn': select_all,
+        'Họ tên': filtered_leaves['tenNhanVien'],
+        'Ngày đăng ký': filtered_leaves['ngayDangKy_display'],
+        'Loại phép': filtered_leaves['loaiPhep'],
+        'Thời gian đăng ký': filtered_leaves['thoiGianDangKy_display'],
+        'Đã duyệt cùng ngày': filtered_leaves['daDuyetCungNgay'],
+        'Thiếu người': filtered_leaves['thieuNguoi'].map({True: "⚠️", False: ""})
+    }, index=filtered_leaves.index)
+
+    edited = st.data_editor(
+        table,
+        disabled=['Họ tên', 'Ngày đăng ký', 'Loại phép', 'Thời gian đăng ký', 'Đã duyệt cùng ngày', 'Thiếu người'],
+        use_container_width=True, hide_index=True,
+        key=f"bulk_table_{select_all}"
+    )
+    selected = edited.index[edited['Chọn']].tolist()
+    st.write(f"Đã chọn {len(selected)}/{len(edited)} đăng ký.")
+
+    col1, col2 = st.columns(2)
+    with col1:
+        approve = st.button("Duyệt đã chọn", disabled=not selected, key="bulk_approve")
+    with col2:
+        reject = st.button("Không duyệt đã chọn", disabled=not selected, key="bulk_reject")
+
+    if approve or reject:
+        status = "Duyệt" if approve else "Không duyệt"
+
+        # Queue every selected row and write them all in one batchUpdate
+        queue_status_updates(
+            {filtered_leaves.loc[index, RECORD_ID_COLUMN]: {"DuyetPhep": status} for index in selected},
+            PENDING_STATE
+        )
+        write_queue = get_write_queue()
+        if write_queue.flush():
+            flash_and_rerun("success", f"{status} thành công {len(selected)} đăng ký.")
+        else:
+            flash_and_rerun(
+                "error", f"❌ Lỗi khi ghi dữ liệu: {write_queue.last_error}. Các thay đổi sẽ được ghi lại sau."
+            )
+
+
+def performance_stats():
+    """Stats of the shared components, for the performance page and log."""
+    write_queue = get_write_queue()
+    locator = get_row_locator()
+    worker = get_sync_worker()
+    return {
+        "sheets_api": get_sheets_gateway().metrics(),
+        "sheet_cache": get_sheet_cache().stats(),
+        "derived_builds": {
+            "leave_frame": get_typed_frame_cache().builds,
+            "leave_stats": get_leave_stats_cache().builds,
+            "occupancy": get_occupancy_cache().builds,
+            "staff_index": get_staff_index_cache().builds,
+        },
+        # New data versions applied to the previous value instead of rebuilding it
+        "derived_updates": {
+            "leave_frame": get_typed_frame_cache().updates,
+            "leave_stats": get_leave_stats_cache().updates,
+            "occupancy": get_occupancy_cache().updates,
+        },
+        "write_queue": {
+            "pending": write_queue.pending_count(),
+            "flushed_batches": write_queue.flushed_batches,
+            "flushed_rows": write_queue.flushed_rows,
+            "failed_flushes": write_queue.failed_flushes,
+            "relocations": locator.relocations,
+            "conflicts": locator.conflicts,
+        },
+        "sync_worker": worker.stats() if worker is not None else None,
+        "startup": startup_profile.profile(),
+    }
+
+
+def admin_performance_page():
+    """Timings and counters of this server process, shared by all sessions."""
+    show_flash_message()
+    stats = performance_stats()
+    snapshot = perf_metrics.snapshot(**stats)
+    st.caption(f"Số liệu của tiến trình máy chủ từ {snapshot['since']} (tất cả phiên làm việc).")
+
+    api = stats["sheets_api"]
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Lần gọi Sheets", api["calls"])
+    col2.metric("Thử lại", api["retries"])
+    col3.metric("Bị giới hạn (429)", api["rate_limited"])
+    col4.metric("p95 Sheets (ms)", round(api["p95_latency"] * 1000))
+
+    cache = stats["sheet_cache"]
+    lookups = cache["hits"] + cache["misses"]
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Cache trúng", f"{cache['hits'] / lookups:.0%}" if lookups else "-")
+    col2.metric("Phép chờ ghi", stats["write_queue"]["pending"])
+    col3.metric("Xung đột ghi", stats["write_queue"]["conflicts"])
+    runs = st.session_state.get('script_runs', 0)
+    col4.metric(
+        "Gọi Sheets / lượt (phiên này)",
+        f"{st.session_state.get('sheets_calls', 0) / runs:.1f}" if runs else "-"
+    )
+
+    st.write("**Thời gian xử lý** (p50/p95/p99/max trên 1000 lần gần nhất)")
+    spans = pd.DataFrame(snapshot["spans"])
+    if spans.empty:
+        st.write("Chưa có số liệu.")
+    else:
+        st.dataframe(spans.set_index("name"), use_container_width=True)
+
+    with st.expander("Chi tiết"):
+        st.json({key: value for key, value in snapshot.items() if key != "spans"})
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.download_button(
+            "Tải số liệu (JSON)",
+            data=json.dumps(snapshot, ensure_ascii=False, default=str, indent=2),
+            file_name=f"hieu_nang_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
+            mime="application/json"
+        )
+    with col2:
+        if PERF_LOG_PATH and st.button("Ghi vào log"):
+            perf_metrics.write_log(PERF_LOG_PATH, **stats)
+            st.success(f"Đã ghi vào {PERF_LOG_PATH}.")
+    with col3:
+        if st.button("Đặt lại số liệu"):
+            perf_metrics.reset()
+            flash_and_rerun("success", "Đã đặt lại số liệu thời gian.")
+
+
+@perf_metrics.timed("page.admin_disapproved_leaves")
 def admin_disapproved_leaves():
-    # Fetch leave data
-    leave_df = fetch_sheet_data(LEAVE_SHEET_ID, LEAVE_SHEET_RANGE)
-    nhanvien_df = fetch_sheet_data(NHANVIEN_SHEET_ID, NHANVIEN_SHEET_RANGE)
-
-    # Ensure required columns exist
-    required_columns = ['maNVYT', 'tenNhanVien', 'ngayDangKy', 'loaiPhep', 'thoiGianDangKy', 'DuyetPhep', 'HuyPhep', 'nguoiHuy']
-    for col in required_columns:
-        if col not in leave_df.columns:
-            leave_df[col] = ""  # Add missing columns with default values
-
-    # Convert `ngayDangKy` and `thoiGianDangKy` to datetime for formatting
-    leave_df['ngayDangKy'] = pd.to_datetime(leave_df['ngayDangKy'], errors='coerce')
-    leave_df['thoiGianDangKy'] = pd.to_datetime(leave_df['thoiGianDangKy'], errors='coerce')
-
-    # Format dates as `dd/MM/yyyy` and `dd/MM/yyyy HH:mm:ss`
-    leave_df['ngayDangKy_display'] = leave_df['ngayDangKy'].dt.strftime('%d/%m/%Y')
-    leave_df['thoiGianDangKy_display'] = leave_df['thoiGianDangKy'].dt.strftime('%d/%m/%Y %H:%M:%S')
-
-    # Filter rows where `DuyetPhep` is "Duyệt" and `HuyPhep` is empty
-    approved_leaves = leave_df[
-        (leave_df['DuyetPhep'] == 'Duyệt') & 
-        (leave_df['HuyPhep'].isnull() | (leave_df['HuyPhep'] == ""))
-    ]
+    show_flash_message()
+    display_pending_writes()
+
+    # Rows where `DuyetPhep` is "Duyệt" and `HuyPhep` is empty
+    approved_leaves = query_approved_leaves()
 
     # Add filter for `tenNhanVien`
     st.write("### Lọc theo nhân viên:")
-    employee_options = sorted(nhanvien_df['tenNhanVien'].unique().tolist())  # Fetch and sort all unique names
+    employee_options = get_staff_index().employee_names  # All unique names, sorted
     employee_filter = st.selectbox("Chọn nhân viên", options=["Tất cả"] + employee_options, key="employee_filter")
 
     # Apply the employee filter
@@ -558,37 +1511,84 @@ def admin_disapproved_leaves():
                 **Thời gian đăng ký:** {row['Thời gian đăng ký']}
             """)
 
-            # "Hủy" button
-            if st.button(f"Hủy phép cho {row['Họ tên']}", key=f"cancel_{index}"):
-                # Update the specific row in the Google Sheet
-                row_index = index + 2  # Account for 1-based indexing in Google Sheets and header row
-                sheets_service.spreadsheets().values().update(
-                    spreadsheetId=LEAVE_SHEET_ID,
-                    range=f"Sheet1!G{row_index}:H{row_index}",
-                    valueInputOption="RAW",
-                    body={"values": [["Hủy", st.session_state['user_info']['maNVYT']]]}  # Update HuyPhep and nguoiHuy columns
-                ).execute()
-                st.success(f"Hủy phép thành công cho {row['Họ tên']}.")
-
-                # Re-fetch data to reflect the updated table
-                leave_df = fetch_sheet_data(LEAVE_SHEET_ID, LEAVE_SHEET_RANGE)
-                leave_df['ngayDangKy'] = pd.to_datetime(leave_df['ngayDangKy'], errors='coerce')
-                leave_df['thoiGianDangKy'] = pd.to_datetime(leave_df['thoiGianDangKy'], errors='coerce')
-                leave_df['ngayDangKy_display'] = leave_df['ngayDangKy'].dt.strftime('%d/%m/%Y')
-                leave_df['thoiGianDangKy_display'] = leave_df['thoiGianDangKy'].dt.strftime('%d/%m/%Y %H:%M:%S')
-
-                # Re-apply filters
-                approved_leaves = leave_df[
-                    (leave_df['DuyetPhep'] == 'Duyệt') & 
-                    (leave_df['HuyPhep'].isnull() | (leave_df['HuyPhep'] == ""))
-                ]
-                if employee_filter != "Tất cả":
-                    approved_leaves = approved_leaves[approved_leaves['tenNhanVien'] == employee_filter]
+            # "Hủy" button, once the row has a maPhep (rows typed into the sheet get it on the next read)
+            has_id = row[RECORD_ID_COLUMN] != ""
+            if not has_id:
+                st.caption("Phép này chưa có mã phép; vui lòng tải lại trang sau ít phút để hủy.")
+            if st.button(f"Hủy phép cho {row['Họ tên']}", key=f"cancel_{index}", disabled=not has_id):
+                # Queue the update of the record in the Google Sheet (only if it is still approved)
+                queue_status_update(row[RECORD_ID_COLUMN], {
+                    "HuyPhep": "Hủy",
+                    "nguoiHuy": st.session_state['user_info']['maNVYT']
+                }, {"DuyetPhep": "Duyệt", "HuyPhep": ""})
+                flash_and_rerun("success", f"Hủy phép thành công cho {row['Họ tên']}.")
     else:
         st.write("Không có phép nào đã được duyệt.")
 
 
+@perf_metrics.timed("page.admin_export_page")
+def admin_export_page():
+    # openpyxl and pyarrow are only needed here
+    from leave_export import EXPORT_FORMATS, STATUSES, export_leaves, select_leaves
+
+    show_flash_message()
+
+    # Previous month by default (monthly payroll extract)
+    first_of_month = pd.Timestamp.now().normalize().replace(day=1)
+    col1, col2 = st.columns(2)
+    with col1:
+        start_date = st.date_input(
+            "Ngày bắt đầu", value=first_of_month - pd.DateOffset(months=1), key="export_start"
+        )
+    with col2:
+        end_date = st.date_input("Ngày kết thúc", value=first_of_month - pd.Timedelta(days=1), key="export_end")
+
+    employees = get_staff_index().employees
+    selected_employees = st.multiselect(
+        "Nhân viên (để trống: tất cả)",
+        options=sorted(employees, key=lambda maNVYT: employees[maNVYT]),
+        format_func=lambda maNVYT: f"{employees[maNVYT]} ({maNVYT})",
+        key="export_employees"
+    )
+    statuses = st.multiselect("Trạng thái", options=STATUSES, default=STATUSES, key="export_statuses")
+    fmt = st.radio("Định dạng", list(EXPORT_FORMATS), horizontal=True, key="export_format")
+
+    leave_df = get_leave_frame(start_date, end_date)
+    index = select_leaves(leave_df, start_date, end_date, selected_employees, statuses)
+    st.write(f"{len(index)} dòng phù hợp.")
+
+    # The file is only built when the button is clicked
+    extension, mime = EXPORT_FORMATS[fmt]
+    st.download_button(
+        "Tải xuống",
+        data=lambda: export_leaves(leave_df, index, fmt),
+        file_name=f"nghiphep_{start_date:%Y%m%d}_{end_date:%Y%m%d}.{extension}",
+        mime=mime,
+        disabled=index.empty,
+        key="export_download"
+    )
+
+    # Closed years of the leave tab, moved to one archive tab per year
+    st.write("**Lưu trữ**")
+    first_hot_day = leave_archive.hot_start(LEAVE_HOT_YEARS)
+    closed = leave_archive.closed_rows(get_leave_frame(), first_hot_day)
+    st.caption(
+        f"{len(closed)} phép đã xử lý trước ngày {first_hot_day:%d/%m/%Y} có thể chuyển sang các trang "
+        f"{leave_archive.ARCHIVE_TAB_PREFIX}<năm>. Dữ liệu lưu trữ vẫn được xuất và xem khi chọn khoảng thời gian đó."
+    )
+    if st.button("Lưu trữ các năm cũ", disabled=closed.empty, key="archive_years"):
+        try:
+            with st.spinner("Đang lưu trữ..."):
+                archived = archive_closed_years()
+        except (HttpError, RuntimeError) as e:
+            st.error(f"❌ Lỗi khi lưu trữ: {e}")
+        else:
+            summary = ", ".join(f"{count} phép năm {year}" for year, count in sorted(archived.items()))
+            flash_and_rerun("success", f"Đã lưu trữ {summary or '0 phép'}.")
+
+
 # Function to change password
+@perf_metrics.timed("page.change_password")
 def change_password():
     user_info = st.session_state['user_info']
     st.subheader("Thay đổi mật khẩu")
@@ -599,32 +1599,33 @@ def change_password():
     confirm_password = st.text_input("Xác nhận mật khẩu mới", type="password")
     
     if st.button("Cập nhật mật khẩu"):
-        # Fetch user info from the session state
-        nhanvien_df = st.session_state['nhanvien_df']
+        # Find the current user's record by maNVYT
+        user_record = get_staff_index().by_maNVYT(user_info['maNVYT'])
         
-        # Find the row corresponding to the current user's maNVYT
-        user_row = nhanvien_df[nhanvien_df['maNVYT'] == user_info['maNVYT']]
-        
-        if not user_row.empty:
+        if user_record is not None:
             # Validate old password
-            if user_row.iloc[0]['matKhau'] == old_password:
+            if user_record['matKhau'] == old_password:
                 if new_password == confirm_password:
                     try:
-                        # Find the row index in Google Sheets
-                        row_index = user_row.index[0] + 2  # Add 2 for 1-based indexing and header row
+                        # Row of the user in Google Sheets
+                        row_index = user_record['sheet_row']
                         
                         # Update the matKhau column in the Google Sheet
-                        sheets_service.spreadsheets().values().update(
-                            spreadsheetId=NHANVIEN_SHEET_ID,
-                            range=f"Sheet1!D{row_index}",  # 'matKhau' is in column D
-                            valueInputOption="RAW",
-                            body={"values": [[new_password]]}
-                        ).execute()
+                        _execute(
+                            "sheets.write",
+                            get_sheets_service().spreadsheets().values().update(
+                                spreadsheetId=NHANVIEN_SHEET_ID,
+                                range=f"Sheet1!D{row_index}",  # 'matKhau' is in column D
+                                valueInputOption="RAW",
+                                body={"values": [[new_password]]}
+                            ),
+                            priority=PRIORITY_WRITE
+                        )
+
+                        # The staff index is rebuilt from the next read of the sheet
+                        invalidate_sheet_data(NHANVIEN_SHEET_ID, NHANVIEN_SHEET_RANGE)
                         
                         st.success("Mật khẩu đã được thay đổi thành công!")
-                        
-                        # Refresh the session state to reflect the change
-                        st.session_state['nhanvien_df'] = fetch_sheet_data(NHANVIEN_SHEET_ID, NHANVIEN_SHEET_RANGE)
                     except Exception as e:
                         st.error(f"Lỗi khi thay đổi mật khẩu: {e}")
                 else:
@@ -635,29 +1636,26 @@ def change_password():
             st.error("Không tìm thấy thông tin tài khoản.")
 
 
+perf_metrics.configure(PERF_LOG_PATH, PERF_LOG_INTERVAL, extra=performance_stats)
+
 # Main app logic
 if not st.session_state.get('is_logged_in', False):
-    st.title("Đăng ký phép/bù - Khoa Xét nghiệm")
-    username = st.text_input("Tài khoản", placeholder="e.g., 01234.bvhv")
-    password = st.text_input("Mật khẩu", type="password")
-    
-    if st.button("Login"):
-        with st.spinner("Logging in, please wait..."):
-            time.sleep(1)
-            # Fetch the user
-            user = check_login(username, password)
-            if user is not None:
-                # Ensure maNVYT is handled as a string
-                st.session_state['user_info'] = {
-                    "maNVYT": str(user["maNVYT"]),  # Preserve as string
-                    "tenNhanVien": user["tenNhanVien"],
-                    "chucVu": user["chucVu"]
-                }
-                st.session_state['is_logged_in'] = True
-                st.sidebar.success("Đăng nhập thành công")
-                st.rerun()
-            else:
-                st.error("Sai tên tài khoản hoặc mật khẩu")
+    # The form is painted at the top of the script; only a click on "Login" gets here
+    with st.spinner("Logging in, please wait..."):
+        # Look up the user in the shared staff index
+        user = check_login(username, password)
+        if user is not None:
+            # Ensure maNVYT is handled as a string
+            st.session_state['user_info'] = {
+                "maNVYT": str(user["maNVYT"]),  # Preserve as string
+                "tenNhanVien": user["tenNhanVien"],
+                "chucVu": user["chucVu"]
+            }
+            st.session_state['is_logged_in'] = True
+            st.sidebar.success("Đăng nhập thành công")
+            st.rerun()
+        else:
+            st.error("Sai tên tài khoản hoặc mật khẩu")
 else:
     # Display greeting at the top of the main page
     user_info = st.session_state['user_info']
@@ -675,7 +1673,7 @@ else:
     # Define pages
     pages = ["Danh sách đăng ký phép", "Phép của tôi", "Đăng ký phép mới", "Thay đổi mật khẩu"]
     if role == "admin":
-        pages.extend(["Duyệt phép", "Hủy duyệt phép"])  # Extend list for admin pages
+        pages.extend(["Duyệt phép", "Hiệu năng", "Hủy duyệt phép", "Xuất dữ liệu"])  # Extend list for admin pages
 
     # Sidebar navigation
     page = st.sidebar.radio("Chọn trang", pages)
@@ -693,13 +1691,22 @@ else:
     elif page == "Duyệt phép" and role == "admin":
         st.subheader("Duyệt phép")  # Smaller than st.title
         admin_approval_page()
+    elif page == "Hiệu năng" and role == "admin":
+        st.subheader("Hiệu năng")  # Smaller than st.title
+        admin_performance_page()
     elif page == "Hủy duyệt phép" and role == "admin":
         st.subheader("Hủy duyệt phép")  # Smaller than st.title
         admin_disapproved_leaves()
+    elif page == "Xuất dữ liệu" and role == "admin":
+        st.subheader("Xuất dữ liệu")  # Smaller than st.title
+        admin_export_page()
     elif page == "Thay đổi mật khẩu":
         st.subheader("Thay đổi mật khẩu")  # Smaller than st.title
         change_password()
 
+    startup_profile.mark("first_page")
+    count_session_calls()
+
     # Footer
     st.sidebar.markdown("---")
     st.sidebar.markdown(
@@ -0,0 +1,103 @@
+"""Render time of the admin pages as the number of listed leave rows grows.
+
+A render of "Duyệt phép" or "Hủy duyệt phép" should cost one snapshot of the
+leave data plus a constant amount of work per displayed row: the time per row
+stays flat and the number of Sheets calls per render does not grow with the
+number of rows.
+
+Run from the repository root:
+
+    python benchmarks/bench_admin_render.py [--sizes 25 50 100 200] [--repeat 5]
+"""
+import argparse
+import datetime
+import os
+import statistics
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path[:0] = [ROOT, BENCH_DIR]
+
+import streamlit as st  # noqa: E402
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+from fake_sheets import FakeSheetsService, patch_google  # noqa: E402
+
+# Same spreadsheet IDs as Main.py
+NHANVIEN_SHEET_ID = '1kzfwjA0nVLFoW8T5jroLyR2lmtdZp8eaYH-_Pyb0nbk'
+LEAVE_SHEET_ID = '1WFaY0f6Mlkin5PE-l1KvN5sq0yteJfOSVwkzr_TYplo'
+
+LEAVE_HEADERS = ['maNVYT', 'tenNhanVien', 'ngayDangKy', 'loaiPhep', 'thoiGianDangKy', 'DuyetPhep', 'HuyPhep', 'nguoiHuy', 'maPhep']
+STAFF_HEADERS = ['maNVYT', 'tenNhanVien', 'taiKhoan', 'matKhau', 'chucVu']
+PAGES = ["Duyệt phép", "Hủy duyệt phép"]
+
+
+def make_sheets(rows, staff_count=20):
+    """Staff sheet with one admin, and `rows` pending plus `rows` approved leaves."""
+    staff = [STAFF_HEADERS, ["00000", "Quản trị", "admin", "admin", "admin"]]
+    staff += [[f"{i:05d}", f"Nhân viên {i}", f"nv{i}", "pw", "nhanvien"] for i in range(1, staff_count + 1)]
+
+    leaves = [LEAVE_HEADERS]
+    today = datetime.date.today()
+    for i in range(rows * 2):
+        employee = staff[2 + i % staff_count]
+        leaves.append([
+            employee[0], employee[1],
+            str(today + datetime.timedelta(days=1 + i % 150)),
+            "Phép Ngày",
+            f"{today} 08:00:00",
+            "Duyệt" if i % 2 else "", "", "",
+            f"bench{i:07d}"
+        ])
+    return {NHANVIEN_SHEET_ID: staff, LEAVE_SHEET_ID: leaves}
+
+
+def login_as_admin():
+    at = AppTest.from_file(os.path.join(ROOT, "Main.py"), default_timeout=300)
+    at.secrets["GOOGLE_CREDENTIALS"] = "{}"
+    at.run()
+    at.text_input[0].input("admin")
+    at.text_input[1].input("admin")
+    at.button[0].click()
+    at.run()
+    return at
+
+
+def bench_page(page, rows, repeat):
+    """Median render time (s) and Sheets calls per render once the page is open."""
+    st.cache_resource.clear()
+    service = FakeSheetsService(make_sheets(rows))
+    with patch_google(service):
+        at = login_as_admin()
+        at.sidebar.radio[0].set_value(page)
+        at.run()
+        if at.exception:
+            raise RuntimeError(at.exception[0].message)
+
+        calls_before = len(service.calls)
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            at.run()
+            timings.append(time.perf_counter() - start)
+        calls = (len(service.calls) - calls_before) / repeat
+    return statistics.median(timings), calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[25, 50, 100, 200])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'page':<16} {'rows':>6} {'ms/render':>10} {'ms/row':>8} {'calls/render':>13}")
+    for page in PAGES:
+        for rows in args.sizes:
+            seconds, calls = bench_page(page, rows, args.repeat)
+            print(f"{page:<16} {rows:>6} {seconds * 1000:>10.1f} {seconds * 1000 / rows:>8.2f} {calls:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
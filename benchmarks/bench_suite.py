@@ -0,0 +1,208 @@
+"""End-to-end timings of Main.py on synthetic data of increasing size.
+
+For each number of leave rows, a fresh process cache is filled from the
+in-memory Sheets stand-in and the following are timed:
+
+- login (cold: empty caches; warm: a new session on a running server)
+- every page, first render after switching to it and later reruns
+- the calendar view of "Danh sách đăng ký phép"
+- registering a leave, approving one, and writing queued approvals
+
+`calls` is the number of Sheets calls the session waited on per operation;
+`api` counts every call, including those of background threads. Save a run
+with --output and compare a later one against it with --compare.
+
+Run from the repository root:
+
+    python benchmarks/bench_suite.py [--sizes 1000 10000 100000] [--staff 1000] [--latency 0.1]
+
+Pages that list every matching row (e.g. "Hủy duyệt phép") take minutes at
+100k leaves; use --pages to time a subset.
+"""
+import argparse
+import datetime
+import json
+import os
+import statistics
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path[:0] = [ROOT, BENCH_DIR]
+
+import streamlit as st  # noqa: E402
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+from fake_sheets import FakeSheetsService, patch_google  # noqa: E402
+from synthetic_data import ADMIN_LOGIN, make_sheets  # noqa: E402
+
+PAGES = [
+    "Danh sách đăng ký phép", "Phép của tôi", "Đăng ký phép mới", "Thay đổi mật khẩu",
+    "Duyệt phép", "Hiệu năng", "Hủy duyệt phép", "Xuất dữ liệu",
+]
+
+
+class Session:
+    """One browser session of Main.py, counting the Sheets calls it makes."""
+
+    def __init__(self, service):
+        self.service = service
+        self.at = AppTest.from_file(os.path.join(ROOT, "Main.py"), default_timeout=600)
+        self.at.secrets["GOOGLE_CREDENTIALS"] = "{}"
+
+    def session_calls(self):
+        state = self.at.session_state
+        return state["sheets_calls"] if "sheets_calls" in state else 0
+
+    def run(self):
+        self.at.run()
+        if self.at.exception:
+            raise RuntimeError(self.at.exception[0].message)
+
+    def login(self, username, password):
+        self.run()
+        self.at.text_input[0].input(username)
+        self.at.text_input[1].input(password)
+        self.at.button[0].click()
+        self.run()
+
+    def button(self, label):
+        return next((button for button in self.at.button if button.label == label), None)
+
+
+def measure(results, scenario, leaves, session, action, repeat):
+    """Time `action()` `repeat` times; it returns False to stop early (nothing left to do)."""
+    timings, calls, api = [], [], []
+    for _ in range(repeat):
+        calls_before, api_before = session.session_calls(), len(session.service.calls)
+        start = time.perf_counter()
+        if action() is False:
+            break
+        timings.append(time.perf_counter() - start)
+        calls.append(session.session_calls() - calls_before)
+        api.append(len(session.service.calls) - api_before)
+    if not timings:
+        return
+
+    result = {
+        "scenario": scenario,
+        "leaves": leaves,
+        "median_ms": round(statistics.median(timings) * 1000, 1),
+        "max_ms": round(max(timings) * 1000, 1),
+        "calls": round(statistics.mean(calls), 1),
+        "api": round(statistics.mean(api), 1),
+    }
+    results.append(result)
+    print(
+        f"{scenario:<36} {leaves:>8} {result['median_ms']:>10.1f} {result['max_ms']:>10.1f} "
+        f"{result['calls']:>6.1f} {result['api']:>6.1f}",
+        flush=True
+    )
+
+
+def bench_size(results, leaves, args):
+    st.cache_resource.clear()
+    service = FakeSheetsService(
+        make_sheets(args.staff, leaves, args.years, args.seed),
+        latency=args.latency,
+        quota_per_minute=args.quota,
+        error_rate=args.error_rate,
+        seed=args.seed
+    )
+
+    with patch_google(service):
+        # Login on an empty cache, then new sessions on the warm server
+        admin = Session(service)
+        measure(results, "login (cold)", leaves, admin, lambda: admin.login(*ADMIN_LOGIN), 1)
+        measure(results, "login (warm)", leaves, admin, lambda: Session(service).login(*ADMIN_LOGIN), args.repeat)
+
+        for page in args.pages:
+            admin.at.sidebar.radio[0].set_value(page)
+            measure(results, f"{page} (first)", leaves, admin, admin.run, 1)
+            measure(results, f"{page} (rerun)", leaves, admin, admin.run, args.repeat)
+
+            if page == "Danh sách đăng ký phép":
+                admin.at.radio(key="all_leaves_view").set_value("Lịch")
+                measure(results, f"{page} (Lịch)", leaves, admin, admin.run, args.repeat)
+                admin.at.radio(key="all_leaves_view").set_value("Danh sách")
+                admin.run()
+
+        # Registration: one new day per repeat, counting back from the last allowed day
+        admin.at.sidebar.radio[0].set_value("Đăng ký phép mới")
+        admin.run()
+        days = iter(admin.at.date_input(key="registration_date").max - datetime.timedelta(days=i) for i in range(1000))
+
+        def register():
+            admin.at.date_input(key="registration_date").set_value(next(days))
+            admin.at.selectbox(key="leave_type").set_value("Bù Chiều")
+            admin.button("Xác nhận đăng ký").click()
+            admin.run()
+        measure(results, "register one day", leaves, admin, register, args.repeat)
+
+        # Approval of the first pending leave, then writing the queued approvals
+        admin.at.sidebar.radio[0].set_value("Duyệt phép")
+        admin.run()
+
+        def approve():
+            button = admin.button("Duyệt")
+            if button is None:
+                return False
+            button.click()
+            admin.run()
+        measure(results, "approve one leave", leaves, admin, approve, args.repeat)
+
+        def write_now():
+            button = admin.button("Ghi ngay")
+            if button is None:
+                return False  # Already written by the queue's timer
+            button.click()
+            admin.run()
+        measure(results, "write queued approvals", leaves, admin, write_now, 1)
+
+    if service.rate_limited or service.server_errors:
+        print(f"  (simulated errors: {service.rate_limited} x 429, {service.server_errors} x 503)")
+
+
+def compare(results, baseline_path):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {(r["scenario"], r["leaves"]): r for r in json.load(f)["results"]}
+
+    print(f"\nCompared with {baseline_path} (median ms, new / old):")
+    for result in results:
+        old = baseline.get((result["scenario"], result["leaves"]))
+        if old and old["median_ms"]:
+            ratio = result["median_ms"] / old["median_ms"]
+            flag = "  <-- slower" if ratio > 1.2 else ""
+            print(f"{result['scenario']:<36} {result['leaves']:>8} {ratio:>8.2f}x{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10_000, 100_000], help="leave rows")
+    parser.add_argument("--staff", type=int, default=1000)
+    parser.add_argument("--years", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--pages", nargs="+", default=PAGES, choices=PAGES, metavar="PAGE", help="pages to render")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per simulated Sheets call")
+    parser.add_argument("--quota", type=int, default=None, help="simulated Sheets calls allowed per minute")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of calls failing with a 503")
+    parser.add_argument("--output", help="save the results to this JSON file")
+    parser.add_argument("--compare", help="JSON file of an earlier run to compare with")
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'scenario':<36} {'leaves':>8} {'median ms':>10} {'max ms':>10} {'calls':>6} {'api':>6}")
+    for leaves in args.sizes:
+        bench_size(results, leaves, args)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "results": results}, f, ensure_ascii=False, indent=2)
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""In-memory stand-in for the Google Sheets API used by Main.py.
+
+Used by the benchmarks to run Main.py without the live spreadsheets. Sheets are
+plain lists of rows keyed by spreadsheet ID (the first tab, "Sheet1"); other
+tabs, such as the yearly leave archives, are kept in `tabs`. Only A1 ranges
+are supported, which is all Main.py uses. Network latency, the per-minute
+quota (HTTP 429) and random server errors (HTTP 503) can be simulated.
+"""
+import collections
+import contextlib
+import random
+import re
+import threading
+import time
+from unittest import mock
+
+import httplib2
+from googleapiclient.errors import HttpError
+
+A1_RANGE = re.compile(r"^([A-Z]*)(\d*)(?::([A-Z]*)(\d*))?$")
+
+
+def _column_number(letters):
+    number = 0
+    for letter in letters:
+        number = number * 26 + ord(letter) - 64
+    return number
+
+
+def parse_range(range_name):
+    """'Sheet1!F2:H10' -> (first_col, first_row, last_col, last_row), 1-based and inclusive."""
+    a1 = range_name.split("!", 1)[1] if "!" in range_name else ""
+    if not a1:
+        return 1, 1, None, None
+
+    first_col, first_row, last_col, last_row = A1_RANGE.match(a1).groups()
+    if last_col is None and last_row is None:  # Single cell, e.g. 'D5'
+        last_col, last_row = first_col, first_row
+    return (
+        _column_number(first_col) if first_col else 1,
+        int(first_row) if first_row else 1,
+        _column_number(last_col) if last_col else None,
+        int(last_row) if last_row else None,
+    )
+
+
+def http_error(status, reason):
+    """HttpError as raised by googleapiclient for an error response."""
+    content = f'{{"error": {{"code": {status}, "message": "{reason}", "status": "{reason}"}}}}'
+    return HttpError(httplib2.Response({"status": status}), content.encode())
+
+
+class _Request:
+    def __init__(self, service, call):
+        self._service = service
+        self._call = call
+
+    def execute(self, **kwargs):
+        self._service._before_execute()
+        return self._call()
+
+
+class FakeSheetsService:
+    """Implements `spreadsheets().values().get/batchGet/append/update/batchUpdate`
+    and `spreadsheets().get/batchUpdate` (tab list, addSheet, deleteDimension).
+
+    - `latency`: seconds slept per executed call, or a (min, max) range.
+    - `quota_per_minute`: calls allowed in any 60 s window; more raise a 429
+      with RATE_LIMIT_EXCEEDED, like the real API.
+    - `error_rate`: share of calls failing with a 503.
+    """
+
+    def __init__(self, sheets, latency=0.0, quota_per_minute=None, error_rate=0.0, seed=0):
+        self.sheets = sheets  # spreadsheet ID -> list of rows of "Sheet1" (header first)
+        self.tabs = {}  # (spreadsheet ID, tab title) -> list of rows of the other tabs
+        self._gids = {}  # (spreadsheet ID, tab title) -> sheetId
+        self.calls = []  # (method, range or number of ranges) per API call
+        self.latency = latency
+        self.quota_per_minute = quota_per_minute
+        self.error_rate = error_rate
+        self.rate_limited = 0
+        self.server_errors = 0
+        self._random = random.Random(seed)
+        self._recent = collections.deque()  # Times of the calls in the last minute
+        self._lock = threading.Lock()
+
+    def spreadsheets(self):
+        return self
+
+    def values(self):
+        return self
+
+    def get(self, spreadsheetId, range=None, **kwargs):
+        if range is None:  # spreadsheets().get: tab list
+            self.calls.append(("get", None))
+            return _Request(self, lambda: self._metadata(spreadsheetId))
+        self.calls.append(("get", range))
+        return _Request(self, lambda: self._read(spreadsheetId, range))
+
+    def batchGet(self, spreadsheetId, ranges, **kwargs):
+        self.calls.append(("batchGet", len(ranges)))
+        return _Request(self, lambda: {"valueRanges": [self._read(spreadsheetId, r) for r in ranges]})
+
+    def append(self, spreadsheetId, range, body, **kwargs):
+        self.calls.append(("append", range))
+        return _Request(self, lambda: self._append(spreadsheetId, range, body["values"]))
+
+    def update(self, spreadsheetId, range, body, **kwargs):
+        self.calls.append(("update", range))
+        return _Request(self, lambda: self._write(spreadsheetId, range, body["values"]))
+
+    def batchUpdate(self, spreadsheetId, body, **kwargs):
+        if "requests" in body:  # spreadsheets().batchUpdate
+            self.calls.append(("batchUpdate", len(body["requests"])))
+            return _Request(self, lambda: self._apply(spreadsheetId, body["requests"]))
+        self.calls.append(("batchUpdate", len(body["data"])))
+
+        def call():
+            for item in body["data"]:
+                self._write(spreadsheetId, item["range"], item["values"])
+            return {"totalUpdatedRanges": len(body["data"])}
+        return _Request(self, call)
+
+    def _before_execute(self):
+        with self._lock:
+            if isinstance(self.latency, tuple):
+                delay = self._random.uniform(*self.latency)
+            else:
+                delay = self.latency
+            failed = self.error_rate and self._random.random() < self.error_rate
+
+            now = time.monotonic()
+            while self._recent and now - self._recent[0] >= 60:
+                self._recent.popleft()
+            limited = self.quota_per_minute is not None and len(self._recent) >= self.quota_per_minute
+            if not limited:
+                self._recent.append(now)  # Rejected calls do not use quota
+
+        if delay:
+            time.sleep(delay)
+        if limited:
+            self.rate_limited += 1
+            raise http_error(429, "RATE_LIMIT_EXCEEDED")
+        if failed:
+            self.server_errors += 1
+            raise http_error(503, "UNAVAILABLE")
+
+    def _rows(self, sheet_id, range_name):
+        tab = range_name.split("!", 1)[0]
+        if tab == "Sheet1":
+            return self.sheets[sheet_id]
+        if (sheet_id, tab) not in self.tabs:
+            raise http_error(400, f"Unable to parse range: {range_name}")
+        return self.tabs[(sheet_id, tab)]
+
+    def _metadata(self, sheet_id):
+        titles = ["Sheet1"] + [title for spreadsheet, title in self.tabs if spreadsheet == sheet_id]
+        return {"sheets": [
+            {"properties": {"sheetId": self._gids.get((sheet_id, title), 0), "title": title}} for title in titles
+        ]}
+
+    def _apply(self, sheet_id, requests):
+        replies = []
+        for request in requests:
+            if "addSheet" in request:
+                title = request["addSheet"]["properties"]["title"]
+                if title == "Sheet1" or (sheet_id, title) in self.tabs:
+                    raise http_error(400, f"A sheet with the name {title} already exists")
+                self.tabs[(sheet_id, title)] = []
+                self._gids[(sheet_id, title)] = len(self._gids) + 1
+                replies.append({"addSheet": {"properties": {"sheetId": self._gids[(sheet_id, title)], "title": title}}})
+            elif "deleteDimension" in request:
+                grid = request["deleteDimension"]["range"]
+                title = next(t for t, gid in self._tab_ids(sheet_id).items() if gid == grid["sheetId"])
+                del self._rows(sheet_id, title)[grid["startIndex"]:grid["endIndex"]]
+                replies.append({})
+            else:
+                raise http_error(400, f"Unsupported request: {list(request)}")
+        return {"spreadsheetId": sheet_id, "replies": replies}
+
+    def _tab_ids(self, sheet_id):
+        return {sheet["properties"]["title"]: sheet["properties"]["sheetId"] for sheet in self._metadata(sheet_id)["sheets"]}
+
+    def _read(self, sheet_id, range_name):
+        first_col, first_row, last_col, last_row = parse_range(range_name)
+        rows = self._rows(sheet_id, range_name)[first_row - 1:last_row]
+        values = [list(row[first_col - 1:last_col]) for row in rows]
+
+        # Like the real API, drop trailing empty cells and rows
+        for row in values:
+            while row and row[-1] == "":
+                row.pop()
+        while values and not values[-1]:
+            values.pop()
+        return {"range": range_name, "values": values} if values else {"range": range_name}
+
+    def _write(self, sheet_id, range_name, values):
+        first_col, first_row, _, _ = parse_range(range_name)
+        rows = self._rows(sheet_id, range_name)
+        for offset, new_values in enumerate(values):
+            while len(rows) < first_row + offset:
+                rows.append([])
+            row = rows[first_row - 1 + offset]
+            end = first_col - 1 + len(new_values)
+            row.extend([""] * (end - len(row)))
+            row[first_col - 1:end] = new_values
+        return {"updatedRange": range_name}
+
+    def _append(self, sheet_id, range_name, values):
+        rows = self._rows(sheet_id, range_name)
+        start = len(rows) + 1
+        rows.extend(list(row) for row in values)
+        tab = range_name.split("!", 1)[0]
+        return {"updates": {"updatedRange": f"{tab}!A{start}:Z{len(rows)}", "updatedRows": len(values)}}
+
+
+@contextlib.contextmanager
+def patch_google(service):
+    """Make Main.py use `service` instead of building a real Sheets client.
+
+    Main.py keeps its client in st.cache_resource, so clear that cache before
+    switching to a different service.
+    """
+    with mock.patch("sheets_client.build_sheets_service", return_value=service):
+        yield service
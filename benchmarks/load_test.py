@@ -0,0 +1,252 @@
+"""Many concurrent sessions of Main.py against the in-memory Sheets stand-in.
+
+Each simulated staff member logs in, opens the leave list, registers a day
+off and looks at their own leaves; every `--admin-every`-th session is an
+admin who logs in and approves pending leaves instead. All sessions of a
+level run at the same time in one server process, so they share the caches,
+the write queue and the Sheets quota like real users do.
+
+For each number of sessions the report shows throughput, latency
+percentiles per step, Sheets calls per session and rate-limit events. If
+shared caching and batching work, calls per session go down as sessions
+go up. Latencies include the test harness's own work, which also competes
+for the GIL; compare them between runs rather than with production.
+
+Run from the repository root:
+
+    python benchmarks/load_test.py [--sessions 5 20 50] [--leaves 20000] [--latency 0.1] [--quota 300]
+"""
+import argparse
+import collections
+import datetime
+import os
+import random
+import sys
+import threading
+import time
+import traceback
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path[:0] = [ROOT, BENCH_DIR]
+
+import streamlit as st  # noqa: E402
+from streamlit.runtime import Runtime  # noqa: E402
+from streamlit.runtime.scriptrunner.script_cache import ScriptCache  # noqa: E402
+from streamlit.runtime.secrets import Secrets  # noqa: E402
+from streamlit.testing.v1 import app_test, local_script_runner  # noqa: E402
+
+from bench_suite import Session  # noqa: E402
+from fake_sheets import FakeSheetsService, patch_google  # noqa: E402
+from synthetic_data import ADMIN_LOGIN, STAFF_PASSWORD, make_sheets  # noqa: E402
+
+STEPS = ["login", "list", "register", "my_leaves", "approve"]
+
+
+class _KeepRuntime(type):
+    def __setattr__(cls, name, value):
+        if name != "_instance":
+            super().__setattr__(name, value)
+        elif value is not None:
+            Runtime._instance = value
+
+
+class _SharedRuntime(Runtime, metaclass=_KeepRuntime):
+    pass
+
+
+def allow_concurrent_sessions():
+    """Let AppTest sessions run at the same time in this process.
+
+    AppTest sets the global Runtime and st.secrets before each run and resets
+    them after it, which breaks any other run in progress. Runs now install
+    their runtime but never remove it, and the secrets are set once. Main.py
+    is compiled once for all sessions, like on a real server (compiling in
+    several threads at once is not safe either).
+    """
+    app_test.Runtime = _SharedRuntime
+    script_cache = ScriptCache()
+    app_test.ScriptCache = local_script_runner.ScriptCache = lambda: script_cache
+    secrets = Secrets()
+    secrets._secrets = {"GOOGLE_CREDENTIALS": "{}"}
+    st.secrets = secrets
+
+
+def new_session(service):
+    session = Session(service)
+    session.at.secrets = {}  # Global secrets, see allow_concurrent_sessions
+    return session
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p / 100 * len(values)))] if values else 0.0
+
+
+class LoadRun:
+    """One level of the load test: `sessions` users at once on a fresh server."""
+
+    def __init__(self, service, args):
+        self.service = service
+        self.args = args
+        self.timings = collections.defaultdict(list)  # step -> seconds
+        self.failures = collections.Counter()  # step -> failed steps
+        self.session_calls = []  # Sheets calls each session waited on
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def login(session, username, password):
+        session.login(username, password)
+        if not session.at.sidebar.radio:
+            raise RuntimeError(f"login of {username} failed")
+
+    def step(self, name, session, action):
+        start = time.perf_counter()
+        try:
+            action()
+        except Exception:
+            with self._lock:
+                self.failures[name] += 1
+            if self.args.verbose:
+                traceback.print_exc()
+            return False
+        with self._lock:
+            self.timings[name].append(time.perf_counter() - start)
+        time.sleep(random.uniform(0, self.args.think_time))
+        return True
+
+    def staff_session(self, number, rng):
+        session = new_session(self.service)
+        if not self.step("login", session, lambda: self.login(session, f"nv{number}", STAFF_PASSWORD)):
+            return
+
+        session.at.sidebar.radio[0].set_value("Danh sách đăng ký phép")
+        self.step("list", session, session.run)
+
+        def register():
+            session.at.sidebar.radio[0].set_value("Đăng ký phép mới")
+            session.run()
+            date_input = session.at.date_input(key="registration_date")
+            days = (date_input.max - date_input.min).days
+            date_input.set_value(date_input.min + datetime.timedelta(days=rng.randrange(days + 1)))
+            session.at.selectbox(key="leave_type").set_value(rng.choice(["Phép Ngày", "Phép Sáng", "Phép Chiều"]))
+            session.button("Xác nhận đăng ký").click()
+            session.run()
+        self.step("register", session, register)
+
+        session.at.sidebar.radio[0].set_value("Phép của tôi")
+        self.step("my_leaves", session, session.run)
+        self._done(session)
+
+    def admin_session(self):
+        session = new_session(self.service)
+        if not self.step("login", session, lambda: self.login(session, *ADMIN_LOGIN)):
+            return
+
+        session.at.sidebar.radio[0].set_value("Duyệt phép")
+        session.run()
+        for _ in range(self.args.approvals):
+            button = session.button("Duyệt")
+            if button is None:
+                break
+            button.click()
+            self.step("approve", session, session.run)
+        self._done(session)
+
+    def _done(self, session):
+        with self._lock:
+            self.session_calls.append(session.session_calls())
+
+    def run(self, sessions):
+        rng = random.Random(self.args.seed)
+        threads = []
+        for number in range(1, sessions + 1):
+            if number % self.args.admin_every == 0:
+                target, args = self.admin_session, ()
+            else:
+                target, args = self.staff_session, (number, random.Random(rng.random()))
+            threads.append(threading.Thread(target=target, args=args))
+
+        # The first run sets up Streamlit's test runtime
+        new_session(self.service).run()
+
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+            time.sleep(self.args.ramp_up / sessions)
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - start
+
+
+def app_counters(service):
+    """Retries and 429s seen by the app's gateway, read from the "Hiệu năng" page."""
+    session = new_session(service)
+    session.login(*ADMIN_LOGIN)
+    session.at.sidebar.radio[0].set_value("Hiệu năng")
+    session.run()
+    return {metric.label: metric.value for metric in session.at.metric}
+
+
+def run_level(sessions, args):
+    st.cache_resource.clear()
+    service = FakeSheetsService(
+        make_sheets(args.staff, args.leaves, seed=args.seed),
+        latency=(args.latency / 2, args.latency * 1.5) if args.latency else 0.0,
+        quota_per_minute=args.quota,
+        error_rate=args.error_rate,
+        seed=args.seed
+    )
+    load = LoadRun(service, args)
+    with patch_google(service):
+        elapsed = load.run(sessions)
+        api_calls = len(service.calls)
+        counters = app_counters(service)
+
+    steps = sum(len(values) for values in load.timings.values())
+    print(f"\n=== {sessions} sessions: {elapsed:.1f} s, {steps / elapsed:.2f} steps/s, "
+          f"{len(load.session_calls) / elapsed:.2f} sessions/s")
+    print(f"{'step':<10} {'count':>6} {'failed':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for step in STEPS:
+        values = load.timings.get(step, [])
+        if values or load.failures[step]:
+            print(
+                f"{step:<10} {len(values):>6} {load.failures[step]:>6} "
+                f"{percentile(values, 50) * 1000:>9.0f} {percentile(values, 95) * 1000:>9.0f} "
+                f"{percentile(values, 99) * 1000:>9.0f} {max(values, default=0) * 1000:>9.0f}"
+            )
+    calls_per_session = api_calls / sessions
+    waited = sum(load.session_calls) / len(load.session_calls) if load.session_calls else 0.0
+    print(f"Sheets API calls: {api_calls} in total, {calls_per_session:.2f} per session "
+          f"({waited:.2f} waited on by the session itself)")
+    print(f"Rate limits: {service.rate_limited} x 429 from the API, {service.server_errors} x 503; "
+          f"app retries {counters.get('Thử lại', '?')}, app saw 429 {counters.get('Bị giới hạn (429)', '?')}")
+    return calls_per_session
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, nargs="+", default=[5, 20, 50], help="concurrent sessions per level")
+    parser.add_argument("--staff", type=int, default=1000)
+    parser.add_argument("--leaves", type=int, default=20_000)
+    parser.add_argument("--admin-every", type=int, default=10, help="every n-th session is an admin")
+    parser.add_argument("--approvals", type=int, default=3, help="leaves approved per admin session")
+    parser.add_argument("--ramp-up", type=float, default=5.0, help="seconds over which sessions start")
+    parser.add_argument("--think-time", type=float, default=1.0, help="max seconds a user waits between steps")
+    parser.add_argument("--latency", type=float, default=0.1, help="mean seconds per simulated Sheets call")
+    parser.add_argument("--quota", type=int, default=300, help="simulated Sheets calls allowed per minute")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of calls failing with a 503")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--verbose", action="store_true", help="print the traceback of failed steps")
+    args = parser.parse_args()
+
+    allow_concurrent_sessions()
+    per_session = [(sessions, run_level(sessions, args)) for sessions in args.sessions]
+
+    print("\nSheets API calls per session as sessions grow:")
+    for sessions, calls in per_session:
+        print(f"{sessions:>6} sessions: {calls:6.2f}")
+
+
+if __name__ == "__main__":
+    main()
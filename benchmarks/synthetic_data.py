@@ -0,0 +1,110 @@
+"""Realistic staff and leave sheets for the benchmarks.
+
+Leaves are spread over the last `years` years up to a month ahead, in the
+order they were registered (as appended by the app). Past leaves are mostly
+processed; upcoming ones are often still pending. The same seed always
+gives the same sheets.
+
+Run from the repository root to write the sheets as CSV files, e.g. to
+import into a test spreadsheet:
+
+    python benchmarks/synthetic_data.py --staff 1000 --leaves 100000 --out synthetic/
+"""
+import argparse
+import csv
+import datetime
+import os
+import random
+
+# Same spreadsheet IDs as Main.py
+NHANVIEN_SHEET_ID = '1kzfwjA0nVLFoW8T5jroLyR2lmtdZp8eaYH-_Pyb0nbk'
+LEAVE_SHEET_ID = '1WFaY0f6Mlkin5PE-l1KvN5sq0yteJfOSVwkzr_TYplo'
+
+LEAVE_HEADERS = ['maNVYT', 'tenNhanVien', 'ngayDangKy', 'loaiPhep', 'thoiGianDangKy', 'DuyetPhep', 'HuyPhep', 'nguoiHuy', 'maPhep']
+STAFF_HEADERS = ['maNVYT', 'tenNhanVien', 'taiKhoan', 'matKhau', 'chucVu']
+
+# Accounts of the generated staff sheet
+ADMIN_LOGIN = ("admin", "admin")
+STAFF_PASSWORD = "pw"
+
+LEAVE_TYPES = ["Phép Ngày", "Phép Sáng", "Phép Chiều", "Bù Ngày", "Bù Sáng", "Bù Chiều"]
+LEAVE_TYPE_WEIGHTS = [45, 15, 15, 13, 6, 6]
+
+FAMILY_NAMES = ["Nguyễn", "Trần", "Lê", "Phạm", "Huỳnh", "Hoàng", "Võ", "Phan", "Trương", "Bùi", "Đặng", "Đỗ"]
+MIDDLE_NAMES = ["Văn", "Thị", "Minh", "Ngọc", "Hữu", "Thanh", "Đức", "Thu", "Quốc", "Kim"]
+GIVEN_NAMES = ["An", "Bình", "Châu", "Dũng", "Giang", "Hà", "Hải", "Hạnh", "Hùng", "Khoa", "Lan", "Linh",
+               "Long", "Mai", "Nam", "Nga", "Phúc", "Quân", "Sơn", "Tâm", "Thảo", "Trang", "Tuấn", "Vy"]
+
+
+def make_staff(count, seed=0):
+    """Staff sheet: one admin (ADMIN_LOGIN) and `count - 1` staff (nv1, nv2, ... / STAFF_PASSWORD)."""
+    rng = random.Random(seed)
+    rows = [STAFF_HEADERS, ["00000", "Quản trị viên", *ADMIN_LOGIN, "admin"]]
+    for i in range(1, count):
+        name = f"{rng.choice(FAMILY_NAMES)} {rng.choice(MIDDLE_NAMES)} {rng.choice(GIVEN_NAMES)}"
+        rows.append([f"{i:05d}", name, f"nv{i}", STAFF_PASSWORD, "nhanvien"])
+    return rows
+
+
+def make_leaves(staff, count, years=3, seed=0, today=None):
+    """Leave sheet with `count` rows for the staff rows of `staff` (header included)."""
+    rng = random.Random(seed)
+    today = today or datetime.date.today()
+    first_day = datetime.date(today.year - years + 1, 1, 1)
+    span = (today - first_day).days + 30
+    employees = staff[1:]
+
+    leaves = []
+    for _ in range(count):
+        maNVYT, name = rng.choice(employees)[:2]
+        day = first_day + datetime.timedelta(days=rng.randrange(span))
+        registered = datetime.datetime.combine(day, datetime.time(7)) - datetime.timedelta(
+            days=rng.randint(1, 30)
+        ) + datetime.timedelta(minutes=rng.randrange(10 * 60))  # Office hours, up to a month ahead
+
+        approval, cancelled, cancelled_by = "", "", ""
+        if rng.random() < 0.08:
+            cancelled = "Hủy"
+            cancelled_by = maNVYT if rng.random() < 0.7 else "00000"
+        if day < today:
+            approval = rng.choices(["Duyệt", "Không duyệt", ""], [88, 10, 2])[0]
+        else:
+            approval = rng.choices(["Duyệt", "Không duyệt", ""], [70, 5, 25])[0]
+        if cancelled and cancelled_by == "00000":
+            approval = "Duyệt"  # Admins cancel approved leaves
+
+        leaves.append([
+            maNVYT, name, day.isoformat(), rng.choices(LEAVE_TYPES, LEAVE_TYPE_WEIGHTS)[0],
+            registered.strftime("%Y-%m-%d %H:%M:%S"), approval, cancelled, cancelled_by,
+            f"{rng.getrandbits(48):012x}"
+        ])
+
+    leaves.sort(key=lambda row: row[4])  # Appended in registration order
+    return [LEAVE_HEADERS] + leaves
+
+
+def make_sheets(staff_count=1000, leave_count=100_000, years=3, seed=0):
+    """{spreadsheet ID: rows} for benchmarks.fake_sheets.FakeSheetsService."""
+    staff = make_staff(staff_count, seed)
+    return {NHANVIEN_SHEET_ID: staff, LEAVE_SHEET_ID: make_leaves(staff, leave_count, years, seed)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--staff", type=int, default=1000)
+    parser.add_argument("--leaves", type=int, default=100_000)
+    parser.add_argument("--years", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="synthetic")
+    args = parser.parse_args()
+
+    sheets = make_sheets(args.staff, args.leaves, args.years, args.seed)
+    os.makedirs(args.out, exist_ok=True)
+    for name, sheet_id in [("nhanvien.csv", NHANVIEN_SHEET_ID), ("nghiphep.csv", LEAVE_SHEET_ID)]:
+        with open(os.path.join(args.out, name), "w", newline="", encoding="utf-8") as f:
+            csv.writer(f).writerows(sheets[sheet_id])
+        print(f"{os.path.join(args.out, name)}: {len(sheets[sheet_id]) - 1} rows")
+
+
+if __name__ == "__main__":
+    main()
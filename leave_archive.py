@@ -0,0 +1,79 @@
+"""Year partitions of the leave sheet.
+
+The leave tab (the hot partition) keeps what the pages normally show: the
+last few years, upcoming leaves, and older leaves that are still pending.
+Closed years are moved to one archive tab per year (`NghiPhep_2024`, ...),
+which are only read when a date range reaches them.
+"""
+import re
+
+import pandas as pd
+
+ARCHIVE_TAB_PREFIX = "NghiPhep_"
+_ARCHIVE_TAB = re.compile(rf"^{ARCHIVE_TAB_PREFIX}(\d{{4}})$")
+
+
+def archive_tab(year):
+    return f"{ARCHIVE_TAB_PREFIX}{year}"
+
+
+def archive_years(tab_titles):
+    """Sorted years that have an archive tab."""
+    return sorted(int(match.group(1)) for match in map(_ARCHIVE_TAB.match, tab_titles) if match)
+
+
+def hot_start(hot_years=1, today=None):
+    """First day kept in the leave tab: January 1st, `hot_years - 1` years ago."""
+    today = pd.Timestamp(today) if today is not None else pd.Timestamp.now()
+    return pd.Timestamp(year=today.year - hot_years + 1, month=1, day=1)
+
+
+def years_to_read(years, start_date, end_date, first_hot_day):
+    """Archived years needed for [start_date, end_date] (none when the range is all hot)."""
+    if start_date is None or pd.Timestamp(start_date) >= first_hot_day:
+        return []
+    last = pd.Timestamp(end_date).year if end_date is not None else first_hot_day.year
+    return [year for year in years if pd.Timestamp(start_date).year <= year <= last]
+
+
+def closed_rows(leave_df, first_hot_day):
+    """Index of the typed-frame rows to archive: dated before `first_hot_day` and
+    approved, rejected or cancelled (pending leaves stay in the leave tab)."""
+    pending = (leave_df['DuyetPhep'] == "") & (leave_df['HuyPhep'] != 'Hủy')
+    return leave_df.index[(leave_df['ngayDangKy'] < first_hot_day) & ~pending]
+
+
+def delete_rows_requests(sheet_gid, indexes):
+    """spreadsheets.batchUpdate requests deleting the rows of frame `indexes`.
+
+    One request per run of consecutive rows, bottom-up so that earlier
+    deletions do not move the rows of later ones.
+    """
+    runs = []
+    for index in sorted(indexes):
+        if runs and index == runs[-1][1] + 1:
+            runs[-1][1] = index
+        else:
+            runs.append([index, index])
+
+    return [
+        {"deleteDimension": {"range": {
+            "sheetId": sheet_gid,
+            "dimension": "ROWS",
+            "startIndex": first + 1,  # Frame index + 1 = 0-based row under the header
+            "endIndex": last + 2,
+        }}}
+        for first, last in reversed(runs)
+    ]
+
+
+def combine(frames):
+    """Typed frames of several partitions as one frame.
+
+    Each partition numbers its rows from 0, so the result is renumbered: its
+    index no longer gives sheet rows (writes use `maPhep` anyway).
+    """
+    frames = [frame for frame in frames if not frame.empty] or frames[:1]
+    if len(frames) == 1:
+        return frames[0]
+    return pd.concat(frames, ignore_index=True)
@@ -0,0 +1,106 @@
+import io
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet export is only offered when pyarrow is installed
+    pa = pq = None
+
+EXPORT_COLUMNS = [
+    'maPhep', 'maNVYT', 'tenNhanVien', 'ngayDangKy', 'loaiPhep', 'soNgay',
+    'trangThai', 'thoiGianDangKy', 'DuyetPhep', 'HuyPhep', 'nguoiHuy'
+]
+STATUSES = ["Chờ duyệt", "Duyệt", "Không duyệt", "Đã hủy"]
+
+# Format name -> (file extension, mime type)
+EXPORT_FORMATS = {
+    "CSV": ("csv", "text/csv"),
+    "XLSX": ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+}
+if pq is not None:
+    EXPORT_FORMATS["Parquet"] = ("parquet", "application/vnd.apache.parquet")
+
+
+def leave_status(leave_df):
+    """One status per row: "Đã hủy", "Duyệt", "Không duyệt" or "Chờ duyệt"."""
+    return pd.Series(np.select(
+        [leave_df['HuyPhep'] == 'Hủy', leave_df['DuyetPhep'] == 'Duyệt', leave_df['DuyetPhep'] == 'Không duyệt'],
+        ["Đã hủy", "Duyệt", "Không duyệt"],
+        default="Chờ duyệt"
+    ), index=leave_df.index)
+
+
+def select_leaves(leave_df, start_date, end_date, maNVYTs=None, statuses=None):
+    """Index labels of the typed-frame rows to export, sorted by date (the frame is not copied)."""
+    mask = (
+        (leave_df['ngayDangKy'] >= pd.Timestamp(start_date)) &
+        (leave_df['ngayDangKy'] <= pd.Timestamp(end_date))
+    )
+    if maNVYTs:
+        mask &= leave_df['maNVYT'].isin([str(m) for m in maNVYTs])
+    if statuses:
+        mask &= leave_status(leave_df).isin(statuses)
+    return leave_df.loc[mask, 'ngayDangKy'].sort_values(kind='stable').index
+
+
+def iter_export_chunks(leave_df, index, chunk_size=5000):
+    """Rows `index` of the typed frame as export-shaped frames of at most `chunk_size` rows.
+
+    Always yields at least one (possibly empty) chunk, so files keep their header.
+    """
+    for start in range(0, max(len(index), 1), chunk_size):
+        rows = leave_df.loc[index[start:start + chunk_size]]
+        chunk = pd.DataFrame({
+            col: rows[col].astype(str) for col in EXPORT_COLUMNS if col not in ('ngayDangKy', 'thoiGianDangKy', 'soNgay', 'trangThai')
+        })
+        chunk['ngayDangKy'] = rows['ngayDangKy']
+        chunk['thoiGianDangKy'] = rows['thoiGianDangKy']
+        chunk['soNgay'] = rows['soNgay'].astype(float)
+        chunk['trangThai'] = leave_status(rows)
+        yield chunk[EXPORT_COLUMNS]
+
+
+def export_leaves(leave_df, index, fmt, chunk_size=5000):
+    """Write rows `index` of the typed leave frame as `fmt` (a key of EXPORT_FORMATS).
+
+    Rows are converted and written `chunk_size` at a time, so only the output
+    file is held in full. Returns the file as a rewound BytesIO.
+    """
+    out = io.BytesIO()
+    chunks = iter_export_chunks(leave_df, index, chunk_size)
+
+    if fmt == "CSV":
+        for number, chunk in enumerate(chunks):
+            chunk = chunk.assign(ngayDangKy=chunk['ngayDangKy'].dt.strftime('%Y-%m-%d'))
+            text = chunk.to_csv(index=False, header=number == 0, date_format='%Y-%m-%d %H:%M:%S')
+            out.write(text.encode('utf-8-sig' if number == 0 else 'utf-8'))  # BOM so Excel reads Vietnamese
+
+    elif fmt == "XLSX":
+        workbook = Workbook(write_only=True)  # Rows are streamed to disk, not kept as cell objects
+        sheet = workbook.create_sheet("NghiPhep")
+        sheet.append(EXPORT_COLUMNS)
+        for chunk in chunks:
+            chunk = chunk.assign(ngayDangKy=chunk['ngayDangKy'].dt.date)
+            chunk = chunk.astype(object).where(chunk.notna(), None)
+            for row in chunk.itertuples(index=False, name=None):
+                sheet.append(row)
+        workbook.save(out)
+
+    elif fmt == "Parquet" and pq is not None:
+        writer = None
+        for chunk in chunks:
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(out, table.schema)
+            writer.write_table(table)  # One row group per chunk
+        writer.close()
+
+    else:
+        raise ValueError(f"Unsupported export format: {fmt}")
+
+    out.seek(0)
+    return out
@@ -0,0 +1,61 @@
+import pandas as pd
+
+from sheets_cache import record_changes
+
+LEAVE_COLUMNS = ['maNVYT', 'tenNhanVien', 'ngayDangKy', 'loaiPhep', 'thoiGianDangKy', 'DuyetPhep', 'HuyPhep', 'nguoiHuy', 'maPhep']
+RECORD_ID_COLUMN = 'maPhep'  # Stable ID of a leave record (column I)
+CATEGORY_COLUMNS = ['maNVYT', 'loaiPhep', 'DuyetPhep', 'HuyPhep']
+HALF_DAY_SUFFIXES = ('Sáng', 'Chiều')  # "Phép Sáng", "Bù Chiều", ... count as half a day
+
+
+def prepare_leave_frame(raw_df):
+    """Turn raw leave rows (all text) into the typed frame used by the pages.
+
+    - `ngayDangKy` and `thoiGianDangKy` are datetime64 (NaT when unparseable)
+    - `maNVYT`, `loaiPhep`, `DuyetPhep` and `HuyPhep` are categorical
+    - `ngayDangKy_display` (dd/mm/yyyy) and `thoiGianDangKy_display`
+      (dd/mm/yyyy HH:MM:SS) hold the formatted dates
+    - `soNgay` is the length of the leave in days (0.5 for morning/afternoon)
+
+    The index is kept (`index + 2` is the sheet row when the frame was read),
+    but writes address records by `maPhep`, not by row.
+    """
+    df = raw_df.reindex(
+        columns=LEAVE_COLUMNS + [col for col in raw_df.columns if col not in LEAVE_COLUMNS],
+        fill_value=""
+    ).fillna("")
+
+    df['ngayDangKy'] = pd.to_datetime(df['ngayDangKy'], errors='coerce')
+    df['thoiGianDangKy'] = pd.to_datetime(df['thoiGianDangKy'], errors='coerce')
+    for col in CATEGORY_COLUMNS:
+        df[col] = df[col].astype(str).astype('category')
+
+    df['ngayDangKy_display'] = df['ngayDangKy'].dt.strftime('%d/%m/%Y')
+    df['thoiGianDangKy_display'] = df['thoiGianDangKy'].dt.strftime('%d/%m/%Y %H:%M:%S')
+    df['soNgay'] = df['loaiPhep'].astype(str).str.endswith(HALF_DAY_SUFFIXES).map({True: 0.5, False: 1.0})
+    return df
+
+
+
+def update_leave_frame(leave_df, raw_df, rows):
+    """Typed frame of `raw_df` from `leave_df`, the typed frame of an earlier
+    version of it where only the index labels `rows` changed or were appended.
+
+    Only `rows` are parsed again; `leave_df` itself is not modified.
+    """
+    changed = prepare_leave_frame(raw_df.loc[rows])
+    df = leave_df.copy()
+    for col in CATEGORY_COLUMNS:
+        # Same categories on both sides, so the columns stay categorical
+        categories = df[col].cat.categories.union(changed[col].cat.categories)
+        df[col] = df[col].cat.set_categories(categories)
+        changed[col] = changed[col].cat.set_categories(categories)
+
+    existing = changed.index.intersection(df.index)
+    if not existing.empty:
+        df.loc[existing] = changed.loc[existing]
+    appended = changed.index.difference(df.index)
+    if not appended.empty:
+        df = pd.concat([df, changed.loc[appended]])
+    record_changes(df, leave_df, rows)
+    return df
@@ -0,0 +1,140 @@
+import sqlite3
+import threading
+
+import pandas as pd
+
+from leave_frame import LEAVE_COLUMNS
+from sheets_cache import changed_rows
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS leaves (
+    row_id INTEGER PRIMARY KEY,  -- Position in the sheet (sheet row - 2)
+    maNVYT TEXT,
+    tenNhanVien TEXT,
+    ngayDangKy TEXT,             -- ISO date (YYYY-MM-DD), NULL if unparseable
+    loaiPhep TEXT,
+    thoiGianDangKy TEXT,
+    DuyetPhep TEXT,
+    HuyPhep TEXT,
+    nguoiHuy TEXT,
+    maPhep TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_leaves_employee_date ON leaves (maNVYT, ngayDangKy);
+CREATE INDEX IF NOT EXISTS idx_leaves_status_date ON leaves (DuyetPhep, HuyPhep, ngayDangKy);
+CREATE INDEX IF NOT EXISTS idx_leaves_date ON leaves (ngayDangKy);
+"""
+
+
+class LeaveMirror:
+    """Local SQLite copy of the leave and staff sheets.
+
+    The mirror is kept in sync with the DataFrames loaded from Google Sheets and
+    answers the page queries through indexes instead of masking the whole
+    frame. It survives restarts, so reads keep working while the Sheets API
+    is throttled or unreachable.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._leaves_source = None
+        self._staff_source = None
+        with self._lock:
+            self._conn.executescript(SCHEMA)
+            # Mirrors created before the maPhep column existed
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(leaves)")}
+            if 'maPhep' not in columns:
+                self._conn.execute("ALTER TABLE leaves ADD COLUMN maPhep TEXT")
+
+    def sync_leaves(self, leave_df):
+        """Bring the mirrored leaves up to `leave_df` (skipped if unchanged).
+
+        When only some rows changed since the last sync (see
+        sheets_cache.changed_rows), only those are written; otherwise the
+        whole table is replaced.
+        """
+        if leave_df is self._leaves_source:
+            return
+
+        changed = changed_rows(self._leaves_source, leave_df)
+        df = leave_df if changed is None else leave_df.loc[changed]
+        df = df.reindex(columns=LEAVE_COLUMNS, fill_value="").fillna("")
+        dates = pd.to_datetime(df['ngayDangKy'], errors='coerce').dt.strftime('%Y-%m-%d')
+        df = df.assign(ngayDangKy=dates.astype(object).where(dates.notna(), None))
+        rows = [(int(index), *values) for index, *values in df.itertuples(name=None)]
+
+        placeholders = ", ".join("?" * (len(LEAVE_COLUMNS) + 1))
+        with self._lock, self._conn:
+            if changed is None:
+                self._conn.execute("DELETE FROM leaves")
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO leaves (row_id, {', '.join(LEAVE_COLUMNS)}) VALUES ({placeholders})",
+                rows
+            )
+        self._leaves_source = leave_df
+
+    def sync_staff(self, nhanvien_df):
+        """Replace the mirrored staff table with `nhanvien_df` (skipped if unchanged)."""
+        if nhanvien_df is self._staff_source:
+            return
+
+        with self._lock, self._conn:
+            nhanvien_df.astype(str).to_sql('nhanvien', self._conn, if_exists='replace', index_label='row_id')
+        self._staff_source = nhanvien_df
+
+    def has_leaves(self):
+        return self._scalar("SELECT COUNT(*) FROM leaves") > 0
+
+    def has_staff(self):
+        return self._scalar(
+            "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = 'nhanvien'"
+        ) > 0
+
+    def leaves(self):
+        """The whole mirrored leave sheet, shaped like a fresh sheet read."""
+        return self._query("SELECT * FROM leaves ORDER BY row_id")
+
+    def staff(self):
+        return self._query("SELECT * FROM nhanvien ORDER BY row_id")
+
+    def all_leaves(self, start_date, end_date):
+        """Non-cancelled leaves in [start_date, end_date] ("Danh sách đăng ký phép")."""
+        return self._query(
+            "SELECT * FROM leaves"
+            " WHERE HuyPhep = '' AND ngayDangKy BETWEEN ? AND ?"
+            " ORDER BY ngayDangKy, thoiGianDangKy",
+            (str(start_date), str(end_date))
+        )
+
+    def user_leaves(self, maNVYT):
+        """Every leave registered by one employee ("Phép của tôi")."""
+        return self._query(
+            "SELECT * FROM leaves WHERE maNVYT = ? AND ngayDangKy IS NOT NULL ORDER BY row_id",
+            (str(maNVYT),)
+        )
+
+    def pending_leaves(self, start_date, end_date):
+        """Leaves waiting for approval in [start_date, end_date] ("Duyệt phép")."""
+        return self._query(
+            "SELECT * FROM leaves"
+            " WHERE DuyetPhep = '' AND HuyPhep = '' AND ngayDangKy BETWEEN ? AND ?"
+            " ORDER BY ngayDangKy, row_id",
+            (str(start_date), str(end_date))
+        )
+
+    def approved_leaves(self):
+        """Approved, non-cancelled leaves ("Hủy duyệt phép")."""
+        return self._query(
+            "SELECT * FROM leaves WHERE DuyetPhep = 'Duyệt' AND HuyPhep = '' ORDER BY row_id"
+        )
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            df = pd.read_sql_query(sql, self._conn, params=params, index_col='row_id')
+        df.index.name = None
+        return df
+
+    def _scalar(self, sql):
+        with self._lock:
+            return self._conn.execute(sql).fetchone()[0]
@@ -0,0 +1,81 @@
+import pandas as pd
+
+
+class DailyOccupancy:
+    """Number of staff off per day and leave type, from the typed leave frame.
+
+    Cancelled and rejected leaves are left out; a morning or afternoon leave
+    counts as 0.5 (the `soNgay` column). Built once with one groupby, then
+    updated with the changed rows of each data version (see
+    sheets_cache.DerivedCache), so the calendar only slices the result.
+    """
+
+    def __init__(self, leave_df):
+        active = self._active(leave_df)
+        self._set_tables(self._aggregate(active), self._aggregate(self._approved_only(active)))
+
+    def updated(self, old_df, leave_df, rows):
+        """Occupancy of `leave_df`, where only `rows` changed since `old_df` (the
+        frame this one was built from). This object is not modified."""
+        removed = self._active(old_df.loc[rows.intersection(old_df.index)])
+        added = self._active(leave_df.loc[rows])
+        occupancy = DailyOccupancy.__new__(DailyOccupancy)
+        occupancy._set_tables(
+            self._change(self._all, added, removed),
+            self._change(self._approved, self._approved_only(added), self._approved_only(removed))
+        )
+        return occupancy
+
+    def _set_tables(self, all_table, approved_table):
+        self._all = all_table
+        self._approved = approved_table
+        self._approved_totals = self._approved.sum(axis=1)
+
+    @staticmethod
+    def _active(leave_df):
+        return leave_df[
+            (leave_df['HuyPhep'] != 'Hủy') &
+            (leave_df['DuyetPhep'] != 'Không duyệt') &
+            leave_df['ngayDangKy'].notna()
+        ]
+
+    @staticmethod
+    def _approved_only(active):
+        return active[active['DuyetPhep'] == 'Duyệt']
+
+    @classmethod
+    def _change(cls, table, added, removed):
+        """`table` plus the leaves of `added`, minus those of `removed`."""
+        for df, sign in ((added, 1.0), (removed, -1.0)):
+            if not df.empty:
+                # Cells missing on both sides (a new leave type on other days) stay NaN
+                table = table.add(sign * cls._aggregate(df), fill_value=0.0).fillna(0.0)
+        table = table.sort_index()
+        table.index.name = 'ngayDangKy'
+        table.columns.name = None
+        return table
+
+    @staticmethod
+    def _aggregate(df):
+        table = df.groupby([df['ngayDangKy'].dt.normalize(), df['loaiPhep'].astype(str)])['soNgay'].sum()
+        table = table.unstack(fill_value=0.0).sort_index()
+        table.index.name = 'ngayDangKy'
+        table.columns.name = None
+        return table
+
+    def daily(self, start_date, end_date, approved_only=False):
+        """Staff off per day in [start_date, end_date]: one column per leave type plus `Tổng`.
+
+        Every day of the range has a row (0 when nobody is off).
+        """
+        table = self._approved if approved_only else self._all
+        days = pd.date_range(start_date, end_date, freq='D', name='ngayDangKy')
+        df = table.reindex(days, fill_value=0.0)
+        df = df.loc[:, (df != 0).any()]  # Only the leave types taken in the range
+        df['Tổng'] = df.sum(axis=1)
+        return df
+
+    def approved_off(self, days):
+        """Approved staff off on each of `days` (a datetime Series), aligned with it."""
+        totals = self._approved_totals.reindex(days.dt.normalize()).fillna(0.0)
+        return pd.Series(totals.to_numpy(), index=days.index)
@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+
+
+def half_of(day):
+    """(year, 1 or 2) of the half-year containing `day`."""
+    day = pd.Timestamp(day)
+    return day.year, 1 if day.month <= 6 else 2
+
+
+class LeaveStats:
+    """Per-employee, per-half-year counters over the typed leave frame.
+
+    Built once, then updated with the changed rows of each data version (see
+    sheets_cache.DerivedCache), and shared by all sessions, so pages and the
+    cancellation limit read them by key instead of masking the frame on
+    every render. For each
+    (maNVYT, year, half):
+
+    - `registrations`: {loaiPhep: number of registrations not cancelled}
+    - `approved_days`: days of approved, not cancelled leave
+    - `self_cancellations` / `admin_cancellations`: cancelled by the
+      employee / by someone else
+    """
+
+    def __init__(self, leave_df):
+        self._counters = {}
+        self._copied = set()  # Keys whose counters belong to this object
+        self._apply(leave_df, 1)
+
+    def updated(self, old_df, leave_df, rows):
+        """Counters of `leave_df`, where only `rows` changed since `old_df` (the
+        frame these counters were built from). This object is not modified."""
+        stats = LeaveStats.__new__(LeaveStats)
+        stats._counters = dict(self._counters)
+        stats._copied = set()
+        stats._apply(old_df.loc[rows.intersection(old_df.index)], -1)
+        stats._apply(leave_df.loc[rows], 1)
+        return stats
+
+    def _apply(self, leave_df, sign):
+        """Add (sign=1) or remove (sign=-1) the rows of `leave_df`."""
+        df = leave_df[leave_df['ngayDangKy'].notna()]
+        maNVYT = df['maNVYT'].astype(str)
+        cancelled = df['HuyPhep'] == 'Hủy'
+        by_self = cancelled & (df['nguoiHuy'].astype(str) == maNVYT)
+        approved = (df['DuyetPhep'] == 'Duyệt') & ~cancelled
+
+        frame = pd.DataFrame({
+            'maNVYT': maNVYT,
+            'year': df['ngayDangKy'].dt.year,
+            'half': np.where(df['ngayDangKy'].dt.month <= 6, 1, 2),
+            'loaiPhep': df['loaiPhep'].astype(str),
+            'active': ~cancelled,
+            'approved_days': df['soNgay'].where(approved, 0.0),
+            'self_cancellations': by_self.astype(int),
+            'admin_cancellations': (cancelled & ~by_self).astype(int),
+        })
+        keys = ['maNVYT', 'year', 'half']
+
+        totals = frame.groupby(keys)[['approved_days', 'self_cancellations', 'admin_cancellations']].sum()
+        for key, values in totals.to_dict('index').items():
+            counters = self._own(key)
+            for name, value in values.items():
+                counters[name] += sign * value
+        by_type = frame[frame['active']].groupby(keys + ['loaiPhep']).size()
+        for (maNVYT_, year, half, loaiPhep), count in by_type.items():
+            registrations = self._own((maNVYT_, year, half))['registrations']
+            registrations[loaiPhep] = registrations.get(loaiPhep, 0) + sign * int(count)
+            if not registrations[loaiPhep]:
+                del registrations[loaiPhep]
+
+    def _own(self, key):
+        # Counters shared with the object this one was updated from are copied first
+        if key not in self._copied:
+            counters = self._counters.get(key)
+            if counters is None:
+                counters = {'approved_days': 0.0, 'self_cancellations': 0, 'admin_cancellations': 0}
+            self._counters[key] = {**counters, 'registrations': dict(counters.get('registrations', {}))}
+            self._copied.add(key)
+        return self._counters[key]
+
+    def get(self, maNVYT, year, half):
+        """Counters of one employee for one half-year (zeros if there is nothing)."""
+        counters = self._counters.get((str(maNVYT), year, half))
+        if counters is None:
+            return {'registrations': {}, 'approved_days': 0.0, 'self_cancellations': 0, 'admin_cancellations': 0}
+        return {**counters, 'registrations': dict(counters['registrations'])}
@@ -0,0 +1,142 @@
+import threading
+import time
+
+import pandas as pd
+
+from sheets_cache import record_changes
+
+
+def column_letter(number):
+    """Convert a 1-based column number to its A1 letter (1 -> A, 27 -> AA)."""
+    letters = ""
+    while number > 0:
+        number, remainder = divmod(number - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+class IncrementalSheetSync:
+    """Local copy of a sheet that is refreshed by reading only what changed.
+
+    The first refresh reads the whole sheet. After that each refresh only asks
+    for the rows appended below the last known row (`A{n+1}:H`), and every
+    `status_interval` seconds re-reads the mutable status columns to pick up
+    approvals and cancellations. A full re-read happens every `full_interval`
+    seconds to recover from rows being deleted or reordered by hand.
+
+    `fetch_values(range_name)` must return the raw `values` list of a
+    `values().get` call, or None when the read failed. `on_read(df)`, if
+    given, is called (under the sync's lock) with the frame of every full read
+    and with the rows of every tail read, and returns the frame to keep, e.g.
+    with missing IDs filled in.
+    """
+
+    def __init__(self, fetch_values, sheet_name, status_columns=('DuyetPhep', 'HuyPhep', 'nguoiHuy'),
+                 status_interval=180, full_interval=1800, on_read=None):
+        self.fetch_values = fetch_values
+        self.on_read = on_read
+        self.sheet_name = sheet_name
+        self.status_columns = list(status_columns)
+        self.status_interval = status_interval
+        self.full_interval = full_interval
+
+        self.df = None
+        self.headers = None
+        self.row_count = 0  # Last sheet row held locally, header included
+        self.last_status_refresh = 0.0
+        self.last_full_refresh = 0.0
+        self._status_dirty = False
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        """Bring the local frame up to date and return it (None if never loaded).
+
+        The same frame object is returned for as long as nothing changed.
+        """
+        with self._lock:
+            now = time.time()
+            if self.df is None or now - self.last_full_refresh >= self.full_interval:
+                self._full_refresh(now)
+                return self.df
+
+            self._fetch_tail()
+            if self._status_dirty or now - self.last_status_refresh >= self.status_interval:
+                self._refresh_status(now)
+            return self.df
+
+    def mark_status_dirty(self):
+        """Re-read the status columns on the next refresh (call after a write)."""
+        self._status_dirty = True
+
+    def reset(self):
+        """Forget the local copy so the next refresh reads the whole sheet."""
+        with self._lock:
+            self.df = None
+            self.headers = None
+            self.row_count = 0
+
+    def _full_refresh(self, now):
+        values = self.fetch_values(self.sheet_name)
+        if not values:
+            return
+
+        self.headers = values[0]
+        self.df = self._to_frame(values[1:])
+        if self.on_read is not None:
+            self.df = self.on_read(self.df)
+            self.headers = list(self.df.columns)  # It may have added a column
+        self.row_count = len(values)
+        self.last_full_refresh = now
+        self.last_status_refresh = now
+        self._status_dirty = False
+
+    def _fetch_tail(self):
+        last_column = column_letter(len(self.headers))
+        values = self.fetch_values(f"{self.sheet_name}!A{self.row_count + 1}:{last_column}")
+        if not values:
+            return
+
+        tail = self._to_frame(values)
+        tail.index = pd.RangeIndex(len(self.df), len(self.df) + len(tail))
+        if self.on_read is not None:
+            tail = self.on_read(tail)  # Indexed like the sheet rows, so the hook can write to them
+        df = pd.concat([self.df, tail])
+        record_changes(df, self.df, tail.index)
+        self.df = df
+        self.row_count += len(values)
+
+    def _refresh_status(self, now):
+        positions = [self.headers.index(col) for col in self.status_columns if col in self.headers]
+        if not positions or self.row_count < 2:
+            self.last_status_refresh = now
+            self._status_dirty = False
+            return
+
+        first, last = min(positions), max(positions)
+        values = self.fetch_values(
+            f"{self.sheet_name}!{column_letter(first + 1)}2:{column_letter(last + 1)}{self.row_count}"
+        )
+        if values is None:
+            return
+
+        # Empty trailing cells and rows are omitted by the API; pad them back
+        width = last - first + 1
+        values = [row[:width] + [""] * (width - len(row)) for row in values[:len(self.df)]]
+        values += [[""] * width] * (len(self.df) - len(values))
+
+        # Keep the same frame (same data version) when nothing changed
+        columns = self.headers[first:last + 1]
+        status = pd.DataFrame(values, index=self.df.index, columns=columns)
+        changed = (status.to_numpy() != self.df[columns].to_numpy()).any(axis=1)
+        if changed.any():
+            df = self.df.copy()
+            df[columns] = status.values
+            record_changes(df, self.df, self.df.index[changed])
+            self.df = df
+        self.last_status_refresh = now
+        self._status_dirty = False
+
+    def _to_frame(self, rows):
+        width = len(self.headers)
+        rows = [row[:width] + [""] * (width - len(row)) for row in rows]
+        return pd.DataFrame(rows, columns=self.headers)
@@ -0,0 +1,156 @@
+"""Process-wide timing spans and counters for the hot paths.
+
+Spans time a block of code (Sheets calls, frame preparation, page renders);
+the last SPAN_WINDOW durations of each span are kept for percentiles.
+Counters count events. Both are shared by every session of the process,
+like startup_profile. Optionally, a snapshot is appended to a JSON-lines
+log file every `log_interval` seconds (see `configure`).
+"""
+import collections
+import contextlib
+import functools
+import json
+import threading
+import time
+
+SPAN_WINDOW = 1000
+
+_lock = threading.Lock()
+_durations = collections.defaultdict(lambda: collections.deque(maxlen=SPAN_WINDOW))
+_span_counts = collections.Counter()
+_span_totals = collections.Counter()
+_counters = collections.Counter()
+_since = time.time()
+_local = threading.local()
+
+_log_path = None
+_log_interval = 300.0
+_log_extra = None
+_last_log = time.monotonic()
+
+
+def configure(log_path=None, log_interval=300.0, extra=None):
+    """Append a snapshot to `log_path` every `log_interval` seconds (None: no log file).
+
+    `extra` is an optional function returning more stats to include, as
+    passed to `snapshot`.
+    """
+    global _log_path, _log_interval, _log_extra
+    _log_path = log_path
+    _log_interval = log_interval
+    _log_extra = extra
+
+
+@contextlib.contextmanager
+def span(name):
+    """Time the block as `name` (recorded even if it raises)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _record(name, time.perf_counter() - start)
+
+
+def timed(name):
+    """Decorator form of `span`."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count(name, n=1):
+    with _lock:
+        _counters[name] += n
+
+
+def thread_count(prefix):
+    """Spans starting with `prefix` finished on the current thread so far."""
+    counts = getattr(_local, 'counts', {})
+    return sum(n for name, n in counts.items() if name.startswith(prefix))
+
+
+def _record(name, seconds):
+    counts = getattr(_local, 'counts', None)
+    if counts is None:
+        counts = _local.counts = collections.Counter()
+    counts[name] += 1
+
+    with _lock:
+        _durations[name].append(seconds)
+        _span_counts[name] += 1
+        _span_totals[name] += seconds
+    _maybe_log()
+
+
+def percentile(values, p):
+    """p-th percentile of an already sorted list (0.0 when empty)."""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(p / 100 * len(values)))]
+
+
+def spans():
+    """One dict per span: name, count, p50/p95/p99/max in ms over the last SPAN_WINDOW, total s."""
+    with _lock:
+        items = [(name, sorted(values), _span_counts[name], _span_totals[name]) for name, values in _durations.items()]
+    return [
+        {
+            "name": name,
+            "count": n,
+            "p50_ms": round(percentile(values, 50) * 1000, 1),
+            "p95_ms": round(percentile(values, 95) * 1000, 1),
+            "p99_ms": round(percentile(values, 99) * 1000, 1),
+            "max_ms": round(values[-1] * 1000, 1),
+            "total_s": round(total, 2),
+        }
+        for name, values, n, total in sorted(items)
+    ]
+
+
+def counters():
+    with _lock:
+        return dict(sorted(_counters.items()))
+
+
+def snapshot(**extra):
+    """Everything as one JSON-serialisable dict; `extra` adds other components' stats."""
+    return {
+        "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "since": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(_since)),
+        "spans": spans(),
+        "counters": counters(),
+        **extra,
+    }
+
+
+def reset():
+    global _since
+    with _lock:
+        _durations.clear()
+        _span_counts.clear()
+        _span_totals.clear()
+        _counters.clear()
+        _since = time.time()
+
+
+def write_log(path, **extra):
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(snapshot(**extra), ensure_ascii=False, default=str) + "\n")
+
+
+def _maybe_log():
+    global _last_log
+    if _log_path is None:
+        return
+    with _lock:
+        if time.monotonic() - _last_log < _log_interval:
+            return
+        _last_log = time.monotonic()
+    try:
+        write_log(_log_path, **(_log_extra() if _log_extra is not None else {}))
+    except Exception:
+        pass  # Logging must never break a page
@@ -0,0 +1,107 @@
+import collections
+import threading
+import time
+
+import pandas as pd
+
+from sheets_cache import changed_rows
+
+
+def registration_key(maNVYT, day, loaiPhep):
+    """(maNVYT, 'YYYY-MM-DD', loaiPhep) key of a registration."""
+    return str(maNVYT), pd.Timestamp(day).strftime('%Y-%m-%d'), str(loaiPhep)
+
+
+class RegistrationIndex:
+    """Set of active (not cancelled) registrations, for O(1) duplicate checks.
+
+    The set follows the typed leave frame once per data version, and
+    registrations appended by this process are added right away, so they
+    count even before the next sheet read includes them. `register()` checks
+    and reserves the keys under a lock, so a double submit or a second tab
+    cannot append the same registration twice; the append itself runs
+    outside the lock, so a slow write does not hold up other registrations.
+    """
+
+    def __init__(self, recent_ttl=600):
+        self.recent_ttl = recent_ttl
+        self._keys = collections.Counter()  # key -> active rows holding it
+        self._recent = {}  # key -> time appended, until a sheet read shows it
+        self._source = None
+        self._lock = threading.Lock()
+        self._update_lock = threading.Lock()
+
+    def update(self, leave_df):
+        """Bring the set up to a typed leave frame (skipped if unchanged).
+
+        When sheets_cache.changed_rows knows the rows that changed since the
+        last update, only those are counted again; otherwise the set is
+        rebuilt.
+        """
+        with self._update_lock:
+            if leave_df is self._source:
+                return
+
+            changed = changed_rows(self._source, leave_df)
+            if changed is None:
+                keys = collections.Counter(self._active_keys(leave_df))
+            else:
+                old = self._source
+                removed = self._active_keys(old.loc[changed.intersection(old.index)])
+                added = self._active_keys(leave_df.loc[changed])
+
+            with self._lock:
+                if changed is None:
+                    self._keys = keys
+                else:
+                    self._keys.update(added)
+                    self._keys.subtract(removed)
+                    for key in removed:
+                        if self._keys[key] <= 0:
+                            del self._keys[key]
+                self._source = leave_df
+                expired = time.monotonic() - self.recent_ttl
+                self._recent = {
+                    key: added for key, added in self._recent.items()
+                    if key not in self._keys and added > expired
+                }
+
+    @staticmethod
+    def _active_keys(leave_df):
+        active = leave_df[(leave_df['HuyPhep'] != 'Hủy') & leave_df['ngayDangKy'].notna()]
+        return list(zip(
+            active['maNVYT'].astype(str),
+            active['ngayDangKy'].dt.strftime('%Y-%m-%d'),
+            active['loaiPhep'].astype(str)
+        ))
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._keys or key in self._recent
+
+    def register(self, keys, append):
+        """Append the `keys` that are not registered yet with one `append(new_keys)` call.
+
+        Returns (added keys, keys that already existed). `append` is not called
+        when every key already exists. Exceptions from `append()` propagate
+        and leave the index unchanged.
+        """
+        with self._lock:
+            duplicates = [key for key in keys if key in self._keys or key in self._recent]
+            new_keys = [key for key in dict.fromkeys(keys) if key not in duplicates]
+            if not new_keys:
+                return [], duplicates
+
+            # Reserved: concurrent registrations of the same keys are duplicates now
+            now = time.monotonic()
+            for key in new_keys:
+                self._recent[key] = now
+
+        try:
+            append(new_keys)
+        except Exception:
+            with self._lock:
+                for key in new_keys:
+                    self._recent.pop(key, None)
+            raise
+        return new_keys, duplicates
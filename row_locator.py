@@ -0,0 +1,103 @@
+import threading
+import uuid
+
+from leave_sync import column_letter
+
+
+def new_record_id():
+    """Stable ID for a new leave record (stored in the `maPhep` column)."""
+    return uuid.uuid4().hex[:12]
+
+
+class RowLocator:
+    """Finds the current sheet row of a record by its ID, and checks it before a write.
+
+    Row numbers come from the last loaded frame and can be stale when rows
+    were inserted, deleted or sorted in the sheet since. `resolve()` reads the
+    target rows (one batchGet for the whole batch) and verifies that each
+    still holds the expected record in the expected state. Records that moved
+    are found again by re-reading only the ID column.
+
+    `fetch_ranges(ranges)` must return the `values` list of each range, in
+    order, as a single `values().batchGet` call would.
+    """
+
+    def __init__(self, fetch_ranges, sheet_name, columns, id_column):
+        self.fetch_ranges = fetch_ranges
+        self.sheet_name = sheet_name
+        self.columns = list(columns)
+        self.id_column = id_column
+        self.relocations = 0
+        self.conflicts = 0
+        self._rows = {}  # record ID -> sheet row
+        self._source = None
+        self._lock = threading.Lock()
+
+    def update(self, df):
+        """Rebuild the ID -> row map from a frame indexed like a sheet read."""
+        if df is self._source or self.id_column not in df.columns:
+            return
+        rows = {record_id: index + 2 for index, record_id in df[self.id_column].items() if record_id}
+        with self._lock:
+            self._rows = rows
+            self._source = df
+
+    def row_of(self, record_id):
+        with self._lock:
+            return self._rows.get(record_id)
+
+    def resolve(self, expected):
+        """Map record IDs to rows that are safe to write.
+
+        `expected` is {record ID: {column: value the writer saw}}. Returns
+        ({record ID: sheet row}, {record ID: reason}) for the records that can
+        be written and the ones that cannot.
+        """
+        with self._lock:
+            guesses = {record_id: self._rows.get(record_id) for record_id in expected}
+
+        rows, conflicts, missing = {}, {}, []
+        self._check(guesses, expected, rows, conflicts, missing)
+
+        if missing:
+            # Rows moved since the last load: re-read just the ID column
+            id_letter = column_letter(self.columns.index(self.id_column) + 1)
+            id_values = self.fetch_ranges([f"{self.sheet_name}!{id_letter}2:{id_letter}"])[0]
+            current = {row[0]: number for number, row in enumerate(id_values, start=2) if row and row[0]}
+            with self._lock:
+                self._rows.update(current)
+            self.relocations += len(missing)
+
+            retry = {record_id: current.get(record_id) for record_id in missing}
+            still_missing = []
+            self._check(retry, expected, rows, conflicts, still_missing)
+            for record_id in still_missing:
+                conflicts[record_id] = "not found"
+
+        self.conflicts += len(conflicts)
+        return rows, conflicts
+
+    def _check(self, guesses, expected, rows, conflicts, missing):
+        located = {record_id: row for record_id, row in guesses.items() if row}
+        missing.extend(record_id for record_id, row in guesses.items() if not row)
+        if not located:
+            return
+
+        last_letter = column_letter(len(self.columns))
+        ranges = [f"{self.sheet_name}!A{row}:{last_letter}{row}" for row in located.values()]
+        id_position = self.columns.index(self.id_column)
+        for (record_id, row), values in zip(located.items(), self.fetch_ranges(ranges)):
+            cells = values[0] if values else []
+            cells = cells + [""] * (len(self.columns) - len(cells))
+            if cells[id_position] != record_id:
+                missing.append(record_id)
+                continue
+
+            changed = [
+                col for col, value in expected[record_id].items()
+                if cells[self.columns.index(col)] != value
+            ]
+            if changed:
+                conflicts[record_id] = "changed: " + ", ".join(changed)
+            else:
+                rows[record_id] = row
@@ -0,0 +1,233 @@
+import collections
+import itertools
+import threading
+import time
+import weakref
+
+import pandas as pd
+
+MAX_CHANGE_LINKS = 256
+
+
+class _Flight:
+    """A load in progress for one cache key, shared by everyone waiting on it."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SheetCache:
+    """Process-wide TTL cache for Google Sheets reads.
+
+    One instance is shared by every Streamlit session in the process, so N
+    users logging in at the same time cost one Sheets call instead of N.
+    Concurrent misses on the same key are de-duplicated (single-flight): the
+    first caller runs the loader and the others wait for its result.
+    """
+
+    def __init__(self, ttl=60):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0  # Misses served by another caller's in-flight load
+        self._lock = threading.Lock()
+        self._entries = {}  # key -> (timestamp, value)
+        self._flights = {}  # key -> _Flight
+
+    def get(self, key, loader, ttl=None):
+        """Return the cached value for `key`, calling `loader()` on a miss.
+
+        A loader result of None is returned to the callers but not cached, so
+        failed reads are retried on the next call.
+        """
+        ttl = self.ttl if ttl is None else ttl
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry[0] < ttl:
+                self.hits += 1
+                return entry[1]
+
+            flight = self._flights.get(key)
+            if flight is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                flight = _Flight()
+                self._flights[key] = flight
+                self.misses += 1
+                leader = True
+
+        if not leader:
+            # Another session is already loading this key; wait for its result
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = loader()
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                if flight.error is None and flight.value is not None:
+                    self._entries[key] = (time.time(), flight.value)
+                self._flights.pop(key, None)
+            flight.done.set()
+        return flight.value
+
+    def refresh(self, key, loader, same=None):
+        """Reload `key` now (e.g. from a background thread) and return True if it changed.
+
+        When the new value is the cached object, or `same(old, new)` is true,
+        the cached object is kept and only its age is reset, so everything
+        derived from it stays valid. Skipped (False) while a load is in flight.
+        """
+        with self._lock:
+            if key in self._flights:
+                return False
+            entry = self._entries.get(key)
+
+        value = loader()
+        if value is None:
+            return False
+
+        with self._lock:
+            old = entry[1] if entry is not None else None
+            if old is not None and (value is old or (same is not None and same(old, value))):
+                self._entries[key] = (time.time(), old)
+                return False
+            self._entries[key] = (time.time(), value)
+            return True
+
+    def invalidate(self, key=None):
+        """Drop one key (or everything) so the next read goes to the API."""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "entries": len(self._entries),
+            }
+
+
+# Which rows changed from one frame version to the next. Each live frame
+# that took part gets a version number (numbers, unlike id(), are never
+# reused), and each link maps a version to (the version it was derived
+# from, index labels changed or appended)
+_versions = {}  # id(frame) -> (weakref to the frame, version)
+_version_numbers = itertools.count(1)
+_change_links = collections.OrderedDict()  # version -> (base version, rows)
+_changes_lock = threading.RLock()  # Reentrant: weakref callbacks may run while it is held
+
+
+def _version(frame, create=False):
+    # Caller holds _changes_lock
+    entry = _versions.get(id(frame))
+    if entry is not None and entry[0]() is frame:
+        return entry[1]
+    if not create:
+        return None
+
+    key = id(frame)
+
+    def forget(ref):
+        with _changes_lock:
+            if _versions.get(key, (None,))[0] is ref:
+                del _versions[key]
+
+    version = next(_version_numbers)
+    _versions[key] = (weakref.ref(frame, forget), version)
+    return version
+
+
+def record_changes(new, old, rows):
+    """Record that frame `new` is `old` with only the index labels `rows` changed or appended.
+
+    Only for frames with the same columns whose index extends `old`'s (no
+    rows deleted or moved). Consumers find the rows again with `changed_rows`.
+    """
+    if new is old:
+        return
+    with _changes_lock:
+        _change_links[_version(new, create=True)] = (_version(old, create=True), pd.Index(rows))
+        while len(_change_links) > MAX_CHANGE_LINKS:
+            _change_links.popitem(last=False)
+
+
+def changed_rows(old, new):
+    """Index labels of `new` that may differ from `old`, or None when unknown.
+
+    Follows the links recorded by `record_changes` from both frames back to
+    a common earlier version. None means the caller must rebuild from `new`.
+    """
+    if old is None or new is None:
+        return None
+    if old is new:
+        return pd.Index([])
+    if list(old.columns) != list(new.columns) or len(old) > len(new):
+        return None
+
+    with _changes_lock:
+        chain = {}  # version -> rows changed from it to `new`
+        version, rows = _version(new), pd.Index([])
+        while version is not None and version not in chain:
+            chain[version] = rows
+            base, link_rows = _change_links.get(version, (None, None))
+            version, rows = base, rows.union(link_rows) if base is not None else rows
+
+        version, rows = _version(old), pd.Index([])
+        seen = set()
+        while version is not None and version not in seen:
+            if version in chain:
+                return rows.union(chain[version])
+            seen.add(version)
+            base, link_rows = _change_links.get(version, (None, None))
+            version, rows = base, rows.union(link_rows) if base is not None else rows
+    return None
+
+
+class DerivedCache:
+    """Value computed from a cached sheet frame, rebuilt only when the frame changes.
+
+    Cached frames are replaced, never modified in place, when new data is
+    loaded, so the frame object itself identifies the data version.
+
+    With `update(value, old_source, source, rows)`, a new version whose
+    changed rows are known (see `changed_rows`) is applied to the previous
+    value instead of rebuilding it; `update` returns the new value and must
+    not modify the previous one, which other sessions may still be reading.
+    """
+
+    def __init__(self, build, update=None):
+        self.build = build
+        self.update = update
+        self.builds = 0
+        self.updates = 0
+        self._source = None
+        self._value = None
+        self._lock = threading.Lock()
+
+    def get(self, source):
+        with self._lock:
+            if source is not self._source:
+                rows = changed_rows(self._source, source) if self.update is not None else None
+                if rows is not None:
+                    self._value = self.update(self._value, self._source, source, rows)
+                    self.updates += 1
+                else:
+                    self._value = self.build(source)
+                    self.builds += 1
+                self._source = source
+            return self._value
@@ -0,0 +1,78 @@
+import contextlib
+import queue
+import threading
+
+import google_auth_httplib2
+import httplib2
+from google.oauth2 import service_account
+from googleapiclient.discovery import build
+from googleapiclient.http import HttpRequest
+
+SCOPES = ["https://www.googleapis.com/auth/spreadsheets"]
+
+
+class HttpPool:
+    """Pool of authorized keep-alive HTTP connections shared by all sessions.
+
+    `httplib2.Http` objects are not thread-safe, so each API call borrows one
+    from the pool for the duration of the request and gives it back after.
+    Idle connections stay open and are reused, which saves a TLS handshake
+    per call. Every connection shares one credentials object whose token is
+    refreshed here, under a lock, instead of by each connection separately.
+    """
+
+    def __init__(self, credentials, size=8, timeout=60):
+        self.credentials = credentials
+        self.size = size
+        self.timeout = timeout
+        self.created = 0
+        self._idle = queue.LifoQueue()
+        self._refresh_lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def connection(self):
+        self._ensure_token()
+        try:
+            http = self._idle.get_nowait()
+        except queue.Empty:
+            http = google_auth_httplib2.AuthorizedHttp(self.credentials, http=httplib2.Http(timeout=self.timeout))
+            self.created += 1
+        try:
+            yield http
+        finally:
+            if self._idle.qsize() < self.size:
+                self._idle.put(http)
+
+    def request_builder(self):
+        """HttpRequest class for `build(requestBuilder=...)` that executes on a pooled connection."""
+        pool = self
+
+        class PooledHttpRequest(HttpRequest):
+            def execute(self, http=None, num_retries=0):
+                if http is not None:
+                    return super().execute(http=http, num_retries=num_retries)
+                with pool.connection() as pooled_http:
+                    return super().execute(http=pooled_http, num_retries=num_retries)
+
+        return PooledHttpRequest
+
+    def _ensure_token(self):
+        if self.credentials.valid:
+            return
+        with self._refresh_lock:
+            if not self.credentials.valid:  # Another thread may have refreshed it meanwhile
+                self.credentials.refresh(google_auth_httplib2.Request(httplib2.Http(timeout=self.timeout)))
+
+
+def build_sheets_service(credentials_info, pool_size=8):
+    """Sheets API client for a service account, safe to share between threads."""
+    credentials = service_account.Credentials.from_service_account_info(credentials_info, scopes=SCOPES)
+    pool = HttpPool(credentials, size=pool_size)
+
+    # The discovery document ships with the client library; no network call here
+    return build(
+        'sheets', 'v4',
+        credentials=credentials,
+        requestBuilder=pool.request_builder(),
+        static_discovery=True
+    )
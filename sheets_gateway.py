@@ -0,0 +1,161 @@
+import collections
+import heapq
+import itertools
+import random
+import threading
+import time
+
+from googleapiclient.errors import HttpError
+
+# Lower value = served first when calls are waiting for quota
+PRIORITY_WRITE = 0  # Interactive writes (approvals, registrations, passwords)
+PRIORITY_READ = 1  # Reads a user is waiting on
+PRIORITY_BACKGROUND = 2  # Refreshes nobody is waiting on
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+def is_rate_limited(error):
+    return isinstance(error, HttpError) and (
+        error.resp.status == 429 or "RATE_LIMIT_EXCEEDED" in str(error)
+    )
+
+
+def is_retryable(error):
+    if isinstance(error, HttpError):
+        return error.resp.status in RETRYABLE_STATUS or is_rate_limited(error)
+    return isinstance(error, (ConnectionError, TimeoutError, OSError))
+
+
+class SheetsGateway:
+    """Single entry point for every Google Sheets API call.
+
+    - A token bucket keeps the process under the per-minute quota. When a 429
+      comes back anyway the rate is halved, then it creeps back up with every
+      successful call (AIMD), so peaks degrade smoothly instead of freezing.
+    - Calls waiting for a token are served by priority, so an admin's
+      approval is not stuck behind background refreshes.
+    - Retryable errors (429, 5xx, network) are retried with exponential
+      backoff and full jitter. Calls that must not run twice (appends) are
+      only retried after a 429: the request was rejected, not applied.
+    - Counters and recent latencies are kept for `metrics()`.
+    """
+
+    def __init__(self, requests_per_minute=60, burst=10, max_retries=5, backoff_base=1.0,
+                 backoff_max=32.0, min_requests_per_minute=6):
+        self.max_rate = requests_per_minute / 60.0
+        self.min_rate = min_requests_per_minute / 60.0
+        self.rate = self.max_rate
+        self.burst = burst
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.throttled = 0  # Calls that had to wait for the limiter
+        self.rate_limited = 0  # 429 / RATE_LIMIT_EXCEEDED responses
+        self.max_queue_depth = 0
+        self._latencies = collections.deque(maxlen=1000)
+
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._waiters = []  # Heap of (priority, sequence)
+        self._sequence = itertools.count()
+        self._cond = threading.Condition()
+
+    def execute(self, request, priority=PRIORITY_READ, max_retries=None, idempotent=True):
+        """Run `request.execute()` under the limiter, retrying retryable errors.
+
+        With `idempotent=False` only 429s are retried: after a 5xx or a network
+        error the request may have been applied even though no response came.
+        """
+        max_retries = self.max_retries if max_retries is None else max_retries
+        attempt = 0
+        while True:
+            self._acquire(priority)
+            start = time.monotonic()
+            try:
+                result = request.execute()
+            except Exception as e:
+                self._record(time.monotonic() - start, error=e)
+                attempt += 1
+                if not is_retryable(e) or attempt >= max_retries or not (idempotent or is_rate_limited(e)):
+                    raise
+                self.retries += 1
+                delay = min(self.backoff_max, self.backoff_base * (2 ** (attempt - 1)))
+                time.sleep(random.uniform(0, delay))
+                continue
+            self._record(time.monotonic() - start)
+            return result
+
+    def queue_depth(self):
+        with self._cond:
+            return len(self._waiters)
+
+    def metrics(self):
+        latencies = sorted(self._latencies)
+
+        def percentile(p):
+            if not latencies:
+                return 0.0
+            return latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))]
+
+        with self._cond:
+            return {
+                "calls": self.calls,
+                "errors": self.errors,
+                "retries": self.retries,
+                "throttled": self.throttled,
+                "rate_limited": self.rate_limited,
+                "queue_depth": len(self._waiters),
+                "max_queue_depth": self.max_queue_depth,
+                "requests_per_minute": round(self.rate * 60, 1),
+                "p50_latency": percentile(50),
+                "p95_latency": percentile(95),
+            }
+
+    def _acquire(self, priority):
+        with self._cond:
+            entry = (priority, next(self._sequence))
+            heapq.heappush(self._waiters, entry)
+            self.max_queue_depth = max(self.max_queue_depth, len(self._waiters))
+            waited = False
+            try:
+                while True:
+                    self._refill()
+                    if self._waiters[0] == entry and self._tokens >= 1:
+                        self._tokens -= 1
+                        break
+                    waited = True
+                    timeout = (1 - self._tokens) / self.rate if self._tokens < 1 else None
+                    self._cond.wait(timeout)
+            finally:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+                self._cond.notify_all()
+            if waited:
+                self.throttled += 1
+
+    def _refill(self):
+        # Caller holds self._cond
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _record(self, latency, error=None):
+        with self._cond:
+            self.calls += 1
+            self._latencies.append(latency)
+            if error is None:
+                # Additive increase back towards the configured quota
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 100)
+                return
+
+            self.errors += 1
+            if is_rate_limited(error):
+                # Multiplicative decrease, and stop handing out the burst
+                self.rate_limited += 1
+                self.rate = max(self.min_rate, self.rate / 2)
+                self._tokens = min(self._tokens, 0)
@@ -0,0 +1,32 @@
+class StaffIndex:
+    """Lookup tables over the staff sheet, built once per sheet version.
+
+    Each staff record is a dict of the sheet's columns (as text) plus
+    `sheet_row`, the row number of the record in the sheet.
+    """
+
+    def __init__(self, nhanvien_df):
+        self._by_account = {}
+        self._by_maNVYT = {}
+
+        records = nhanvien_df.fillna("").astype(str).to_dict('records')
+        for index, record in zip(nhanvien_df.index, records):
+            record['sheet_row'] = index + 2  # 1-based indexing in Google Sheets and header row
+            self._by_account.setdefault(record.get('taiKhoan'), []).append(record)
+            self._by_maNVYT.setdefault(record.get('maNVYT'), record)
+
+        self.employee_names = sorted({record.get('tenNhanVien', "") for record in records} - {""})
+        self.employees = {maNVYT: record.get('tenNhanVien', "") for maNVYT, record in self._by_maNVYT.items() if maNVYT}
+
+    def __len__(self):
+        return len(self._by_maNVYT)
+
+    def authenticate(self, username, password):
+        """Staff record matching the account and password, or None."""
+        for record in self._by_account.get(str(username), []):
+            if record.get('matKhau') == str(password):
+                return record
+        return None
+
+    def by_maNVYT(self, maNVYT):
+        return self._by_maNVYT.get(str(maNVYT))
@@ -0,0 +1,40 @@
+"""Cold-start timings of the app process.
+
+Imported first by Main.py, so the clock starts when the first script run of
+a fresh process begins (e.g. right after Streamlit Cloud wakes the app up).
+Each mark is recorded once per process and printed to the server log.
+"""
+import os
+import time
+
+_START = time.perf_counter()
+_marks = {}
+
+
+def _process_age():
+    """Seconds since this process started, or None where /proc is not available."""
+    try:
+        with open("/proc/self/stat") as f:
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return None
+    return uptime - start_ticks / os.sysconf("SC_CLK_TCK")
+
+
+# Time the server spent starting before the first script run
+_PROCESS_AGE = _process_age()
+
+
+def mark(name):
+    """Record `name` at the current time since the first script run began (first call only)."""
+    if name in _marks:
+        return
+    _marks[name] = time.perf_counter() - _START
+    print(f"[startup] {name}: {_marks[name] * 1000:.0f} ms", flush=True)
+
+
+def profile():
+    """{'server_start': s, mark name: s, ...}; server_start is None when unknown."""
+    return {"server_start": _PROCESS_AGE, **_marks}
@@ -0,0 +1,104 @@
+import threading
+import time
+
+_local = threading.local()
+_running = set()
+_running_lock = threading.Lock()
+
+
+def is_background():
+    """True inside a SheetSyncWorker thread (no user is waiting on the call)."""
+    return getattr(_local, 'background', False)
+
+
+def stop_all():
+    """Stop every running worker, e.g. the one of a cleared resource cache."""
+    with _running_lock:
+        workers = list(_running)
+    for worker in workers:
+        worker.stop()
+
+
+class SheetSyncWorker:
+    """Daemon thread that keeps the shared sheet snapshots fresh.
+
+    Every poll runs each job; a job does a cheap change check (e.g. reading
+    the rows below the last known one) and returns True when it published a
+    new snapshot. While nothing changes the poll interval doubles up to
+    `max_interval`, so an idle app costs little quota; any change brings it
+    back to `interval`. Sessions pick up new snapshots on their next rerun.
+
+    `jobs` is a list of (name, callable, min_interval) tuples; a job runs at
+    most once every `min_interval` seconds.
+    """
+
+    def __init__(self, jobs, interval=10.0, max_interval=120.0):
+        self.jobs = list(jobs)
+        self.interval = interval
+        self.max_interval = max_interval
+        self.current_interval = interval
+
+        self.polls = 0
+        self.changes = {name: 0 for name, _, _ in self.jobs}
+        self._last_run = {name: 0.0 for name, _, _ in self.jobs}
+        self.errors = 0
+        self.last_error = None
+        self.last_poll = None
+
+        self._wake = threading.Event()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="sheet-sync", daemon=True)
+
+    def start(self):
+        with _running_lock:
+            _running.add(self)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped = True
+        self._wake.set()
+        with _running_lock:
+            _running.discard(self)
+
+    def poke(self):
+        """Poll now and go back to the short interval (e.g. after a write)."""
+        self.current_interval = self.interval
+        self._wake.set()
+
+    def poll(self):
+        """Run every job once; returns True if any snapshot changed."""
+        changed = False
+        for name, job, min_interval in self.jobs:
+            if time.monotonic() - self._last_run[name] < min_interval:
+                continue
+            self._last_run[name] = time.monotonic()
+            try:
+                if job():
+                    self.changes[name] += 1
+                    changed = True
+            except Exception as e:  # Keep the worker alive; sessions fall back to their own reads
+                self.errors += 1
+                self.last_error = e
+        self.polls += 1
+        self.last_poll = time.time()
+        return changed
+
+    def stats(self):
+        return {
+            "polls": self.polls,
+            "changes": dict(self.changes),
+            "errors": self.errors,
+            "interval": self.current_interval,
+            "last_poll": self.last_poll,
+        }
+
+    def _run(self):
+        _local.background = True
+        while not self._stopped:
+            if self.poll():
+                self.current_interval = self.interval
+            else:
+                self.current_interval = min(self.max_interval, self.current_interval * 2)
+            self._wake.wait(self.current_interval)
+            self._wake.clear()
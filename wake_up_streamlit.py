@@ -1,47 +1,202 @@
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException
-from streamlit_app import STREAMLIT_APPS
+"""Keep the Streamlit apps awake and record how fast they answer.
+
+Every app in STREAMLIT_APPS is probed concurrently with plain HTTP requests
+(the health endpoint, then the page itself). A headless browser is only
+started for apps that show the "gone to sleep" page, to click the wake-up
+button. Each probe is appended to a JSON-lines history file, and a summary
+with response-time percentiles and wake-up latency is printed.
+
+Usage:
+    python wake_up_streamlit.py              # probe, wake sleeping apps if Selenium is installed
+    python wake_up_streamlit.py --no-browser # probe only; report apps that need a browser wake-up
+"""
+import argparse
+import concurrent.futures
 import datetime
-import tempfile
-import shutil
+import importlib.util
+import json
+import os
+import time
+import urllib.error
+import urllib.request
 
-# ✅ Create a clean temporary directory for Chrome session
-temp_dir = tempfile.mkdtemp()
+from streamlit_app import STREAMLIT_APPS
 
-options = Options()
-options.binary_location = "/usr/bin/chromium-browser"
-options.add_argument('--headless')
-options.add_argument('--no-sandbox')
-options.add_argument('--disable-dev-shm-usage')
-options.add_argument(f'--user-data-dir={temp_dir}')  # ← KEY FIX
+HEALTH_PATH = "~/+/_stcore/health"
+SLEEP_MARKERS = ("Yes, get this app back up", "This app has gone to sleep")
+USER_AGENT = "Mozilla/5.0 (compatible; dangkyphep-keepalive)"
 
-driver = webdriver.Chrome(options=options)
 
-with open("wakeup_log.txt", "a") as log_file:
-    log_file.write(f"Execution started at: {datetime.datetime.utcnow()} UTC\n")
+def fetch(url, timeout):
+    """(HTTP status or None, body text, seconds) of a GET request."""
+    request = urllib.request.Request(url, headers={"User-Agent": USER_AGENT})
+    start = time.monotonic()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            body = response.read(200_000).decode("utf-8", "replace")
+            return response.status, body, time.monotonic() - start
+    except urllib.error.HTTPError as e:
+        return e.code, e.read(200_000).decode("utf-8", "replace"), time.monotonic() - start
+    except (urllib.error.URLError, OSError) as e:
+        return None, str(e), time.monotonic() - start
 
-    for url in STREAMLIT_APPS:
-        try:
-            driver.get(url)
-            WebDriverWait(driver, 15).until(EC.presence_of_element_located((By.TAG_NAME, "body")))
 
+def probe(url, timeout=30):
+    """Probe one app: state is "awake", "asleep" or "error"."""
+    status, body, latency = fetch(url.rstrip("/") + "/" + HEALTH_PATH, timeout)
+    if status == 200 and body.strip() == "ok":
+        state = "awake"
+    else:
+        # The health endpoint does not answer while the app sleeps; look at the page
+        status, body, page_latency = fetch(url, timeout)
+        latency += page_latency
+        if any(marker in body for marker in SLEEP_MARKERS):
+            state = "asleep"
+        elif status == 200:
+            state = "awake"
+        else:
+            state = "error"
+
+    return {
+        "time": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "url": url,
+        "state": state,
+        "status": status,
+        "latency_ms": round(latency * 1000),
+    }
+
+
+def wait_until_awake(url, timeout=180, interval=5):
+    """Seconds until the health endpoint answers "ok", or None after `timeout`."""
+    start = time.monotonic()
+    while time.monotonic() - start < timeout:
+        status, body, _ = fetch(url.rstrip("/") + "/" + HEALTH_PATH, interval * 2)
+        if status == 200 and body.strip() == "ok":
+            return time.monotonic() - start
+        time.sleep(interval)
+    return None
+
+
+def wake_with_browser(urls):
+    """Click "Yes, get this app back up!" on each URL in a headless Chromium.
+
+    Returns {url: seconds until the app answered, or None}.
+    """
+    import shutil
+    import tempfile
+
+    from selenium import webdriver
+    from selenium.common.exceptions import TimeoutException
+    from selenium.webdriver.chrome.options import Options
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.support.ui import WebDriverWait
+
+    # Clean temporary directory for the Chrome session
+    temp_dir = tempfile.mkdtemp()
+    options = Options()
+    options.binary_location = os.environ.get("CHROMIUM_PATH", "/usr/bin/chromium-browser")
+    options.add_argument('--headless')
+    options.add_argument('--no-sandbox')
+    options.add_argument('--disable-dev-shm-usage')
+    options.add_argument(f'--user-data-dir={temp_dir}')
+    driver = webdriver.Chrome(options=options)
+
+    wake_latency = {}
+    try:
+        for url in urls:
+            start = time.monotonic()
+            driver.get(url)
             try:
-                button = WebDriverWait(driver, 10).until(
-                    EC.presence_of_element_located((By.XPATH, "//button[text()='Yes, get this app back up!']"))
+                button = WebDriverWait(driver, 15).until(
+                    EC.element_to_be_clickable((By.XPATH, "//button[contains(., 'get this app back up')]"))
                 )
                 button.click()
-                log_file.write(f"[{datetime.datetime.utcnow()}] ✅ Woke up app: {url}\n")
             except TimeoutException:
-                log_file.write(f"[{datetime.datetime.utcnow()}] ℹ️ No wake-up button at: {url} (already running?)\n")
+                pass  # Woke up on its own while loading
+            awake_after = wait_until_awake(url)
+            wake_latency[url] = None if awake_after is None else time.monotonic() - start
+    finally:
+        driver.quit()
+        shutil.rmtree(temp_dir, ignore_errors=True)
+    return wake_latency
+
+
+def load_history(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def append_history(path, records):
+    with open(path, "a", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p / 100 * len(values)))] if values else None
+
+
+def report(history, urls):
+    """One line per app: latest state, latency percentiles and wake-ups."""
+    lines = []
+    for url in urls:
+        records = [r for r in history if r["url"] == url]
+        if not records:
+            continue
+        latencies = [r["latency_ms"] for r in records if r["state"] == "awake"]
+        wakes = [r["wake_ms"] for r in records if r.get("wake_ms") is not None]
+        asleep = sum(r["state"] == "asleep" for r in records)
+        timing = (
+            f"p50 {percentile(latencies, 50)} ms, p95 {percentile(latencies, 95)} ms over {len(latencies)} probes"
+            if latencies else "no successful probe yet"
+        )
+        lines.append(
+            f"{url}: {records[-1]['state']} ({records[-1]['latency_ms']} ms) | {timing} | "
+            f"asleep {asleep}/{len(records)}"
+            + (f" | last wake-up {wakes[-1] / 1000:.0f} s" if wakes else "")
+        )
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--history", default="wakeup_history.jsonl", help="JSON-lines file of probe results")
+    parser.add_argument("--timeout", type=float, default=30, help="seconds per HTTP request")
+    parser.add_argument("--no-browser", action="store_true", help="never start a browser")
+    args = parser.parse_args()
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(8, len(STREAMLIT_APPS))) as pool:
+        records = list(pool.map(lambda url: probe(url, args.timeout), STREAMLIT_APPS))
+
+    asleep = [r["url"] for r in records if r["state"] == "asleep"]
+    # Selenium is only installed where browser wake-ups are possible
+    can_use_browser = not args.no_browser and importlib.util.find_spec("selenium") is not None
+    if asleep and not can_use_browser:
+        print(f"Asleep, browser wake-up needed: {', '.join(asleep)}")
+        if os.environ.get("GITHUB_OUTPUT"):
+            with open(os.environ["GITHUB_OUTPUT"], "a") as f:
+                f.write("needs_browser=true\n")
+    elif asleep:
+        wake_latency = wake_with_browser(asleep)
+        for record in records:
+            if wake_latency.get(record["url"]) is not None:
+                record["wake_ms"] = round(wake_latency[record["url"]] * 1000)
 
-        except Exception as e:
-            log_file.write(f"[{datetime.datetime.utcnow()}] ❌ Error for {url}: {e}\n")
+    append_history(args.history, records)
+    with open("wakeup_log.txt", "a") as log_file:
+        for record in records:
+            log_file.write(
+                f"[{record['time']}] {record['state']} {record['url']} "
+                f"(HTTP {record['status']}, {record['latency_ms']} ms"
+                + (f", woke up in {record['wake_ms']} ms" if "wake_ms" in record else "")
+                + ")\n"
+            )
+    print(report(load_history(args.history), STREAMLIT_APPS))
 
-driver.quit()
 
-# ✅ Clean up temporary Chrome profile directory
-shutil.rmtree(temp_dir, ignore_errors=True)
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+import collections
+import random
+import threading
+import time
+
+from leave_sync import column_letter
+from sheets_cache import record_changes
+
+
+class StatusWriteQueue:
+    """Write-behind queue for status cells of a sheet.
+
+    Approvals, rejections and cancellations are queued per record ID instead
+    of being written one `values().update` at a time. Several changes to the
+    same record are merged, and everything pending is written by a single
+    `values().batchUpdate` call, `flush_delay` seconds after the first change
+    or on demand through `flush()`. Failed batches are retried with
+    exponential backoff and stay queued until they succeed.
+
+    Each change carries the values the writer saw (`expected`). Before a
+    batch is written, `resolve(expected)` maps the record IDs to their current
+    sheet rows and returns ({record ID: row}, {record ID: reason}); records
+    that moved away or were changed by someone else meanwhile are dropped and
+    kept in `conflicts` instead of overwriting the newer state.
+
+    `execute_batch(data)` receives the `data` list of a batchUpdate body.
+    `on_flushed()` is called after every successful batch.
+    """
+
+    def __init__(self, execute_batch, resolve, sheet_name, columns, key_column, flush_delay=2.0,
+                 max_retries=4, backoff_base=1.0, retry_delay=60.0, on_flushed=None):
+        self.execute_batch = execute_batch
+        self.resolve = resolve
+        self.sheet_name = sheet_name
+        self.columns = list(columns)
+        self.key_column = key_column
+        self.flush_delay = flush_delay
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.retry_delay = retry_delay
+        self.on_flushed = on_flushed
+
+        self.flushed_batches = 0
+        self.flushed_rows = 0
+        self.failed_flushes = 0
+        self.last_error = None
+        self.conflicts = collections.deque(maxlen=50)  # (record ID, values, reason)
+
+        self._pending = {}  # record ID -> {column name: value}
+        self._expected = {}  # record ID -> {column name: value seen by the writer}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._timer = None
+
+    def enqueue(self, key, values, expected=None):
+        """Queue `values` ({column name: value}) for record `key`.
+
+        `expected` ({column name: value}) is the state the change was based on.
+        """
+        self.enqueue_many({key: values}, {key: expected or {}})
+
+    def enqueue_many(self, updates, expected=None):
+        """Queue several records at once ({record ID: {column name: value}})."""
+        expected = expected or {}
+        with self._lock:
+            for key, values in updates.items():
+                self._pending.setdefault(key, {}).update(values)
+                # The first change of a record decides what it was based on
+                self._expected.setdefault(key, dict(expected.get(key, {})))
+            if updates:
+                self._schedule(self.flush_delay)
+
+    def pending(self):
+        """Copy of the queued changes, {record ID: {column name: value}}."""
+        with self._lock:
+            return {key: dict(values) for key, values in self._pending.items()}
+
+    def pending_count(self):
+        with self._lock:
+            return len(self._pending)
+
+    def flush_lock(self):
+        """The lock a flush holds from resolving rows to writing them.
+
+        Hold it around anything that writes or deletes rows by position, so
+        that a flush never writes into rows that moved after it resolved them.
+        """
+        return self._flush_lock
+
+    def take_conflicts(self):
+        """Changes dropped since the last call, as (record ID, values, reason)."""
+        with self._lock:
+            conflicts = list(self.conflicts)
+            self.conflicts.clear()
+        return conflicts
+
+    def overlay(self, df):
+        """Return `df` with queued values applied, so pages see them immediately."""
+        pending = self.pending()
+        if not pending or self.key_column not in df.columns:
+            return df
+
+        positions = {key: index for index, key in df[self.key_column].items() if key and key in pending}
+        if not positions:
+            return df
+
+        overlaid = df.copy()
+        for key, index in positions.items():
+            for col, value in pending[key].items():
+                if col in overlaid.columns:
+                    overlaid.at[index, col] = value
+        record_changes(overlaid, df, list(positions.values()))
+        return overlaid
+
+    def flush(self):
+        """Write everything pending now. Returns True if nothing is left queued."""
+        with self._flush_lock:
+            with self._lock:
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+                snapshot = {key: dict(values) for key, values in self._pending.items()}
+                expected = {key: dict(self._expected.get(key, {})) for key in snapshot}
+            if not snapshot:
+                return True
+
+            for attempt in range(self.max_retries):
+                try:
+                    rows, conflicts = self.resolve(expected)
+                    if conflicts:
+                        self._drop(snapshot, conflicts)
+                    if rows:
+                        self.execute_batch(self._batch_data({rows[key]: snapshot[key] for key in rows}))
+                    break
+                except Exception as e:
+                    self.last_error = e
+                    if attempt + 1 < self.max_retries:
+                        # Exponential backoff with jitter
+                        time.sleep(self.backoff_base * (2 ** attempt) * (1 + random.random()))
+            else:
+                self.failed_flushes += 1
+                with self._lock:
+                    self._schedule(self.retry_delay)
+                return False
+
+            with self._lock:
+                # Keep anything that changed again while the batch was in flight
+                for key in rows:
+                    current = self._pending.get(key)
+                    if current is None:
+                        continue
+                    for col, value in snapshot[key].items():
+                        if current.get(col) == value:
+                            del current[col]
+                    if not current:
+                        del self._pending[key]
+                        self._expected.pop(key, None)
+                    else:
+                        # The rest builds on what was just written
+                        self._expected[key].update(snapshot[key])
+                remaining = bool(self._pending)
+                if remaining:
+                    self._schedule(self.flush_delay)
+
+            if rows:
+                self.flushed_batches += 1
+                self.flushed_rows += len(rows)
+            self.last_error = None
+
+        if self.on_flushed is not None:
+            self.on_flushed()
+        return not remaining
+
+    def _drop(self, snapshot, conflicts):
+        with self._lock:
+            for key, reason in conflicts.items():
+                self._pending.pop(key, None)
+                self._expected.pop(key, None)
+                self.conflicts.append((key, snapshot[key], reason))
+
+    def _schedule(self, delay):
+        # Caller holds self._lock
+        if self._timer is None:
+            self._timer = threading.Timer(delay, self._flush_from_timer)
+            self._timer.start()
+
+    def _flush_from_timer(self):
+        with self._lock:
+            self._timer = None
+        self.flush()
+
+    def _batch_data(self, snapshot):
+        """One range per contiguous run of columns in each row."""
+        data = []
+        for row, values in sorted(snapshot.items()):
+            positions = sorted(self.columns.index(col) for col in values)
+            run = [positions[0]]
+            for position in positions[1:] + [None]:
+                if position is not None and position == run[-1] + 1:
+                    run.append(position)
+                    continue
+                data.append({
+                    "range": f"{self.sheet_name}!{column_letter(run[0] + 1)}{row}:{column_letter(run[-1] + 1)}{row}",
+                    "values": [[values[self.columns[p]] for p in run]]
+                })
+                if position is not None:
+                    run = [position]
+        return data